@@ -2,6 +2,22 @@ cfg = {
     'sim': {
         'backend': 'local_qasm_simulator'
     },
+    'np': {
+        'backend': 'local_numpy_simulator'
+    },
+    'sparse': {
+        'backend': 'local_sparse_simulator'
+    },
+    'disk': {
+        'backend': 'local_memmap_simulator'
+    },
+    'shm': {
+        'backend': 'local_shared_simulator'
+    },
+    'fake': {
+        'backend': 'fake_remote_simulator',
+        'latency': 0.5
+    },
     'qx': {
         'token': '',
         'url': 'https://q-console-api.mybluemix.net/api',
@@ -0,0 +1,182 @@
+import numpy as np
+
+import profiler
+import results
+
+# Grover / amplitude amplification in the plane spanned by the uniform superpositions
+# of marked and unmarked states: after k iterations the marked states have amplitude
+# sin((2k+1)*theta)/sqrt(M) and the unmarked ones cos((2k+1)*theta)/sqrt(N-M),
+# with sin(theta) = sqrt(M/N). Nothing of size N is built unless asked for.
+
+
+def angle(n_bits, n_marked=1):
+    return np.arcsin(np.sqrt(n_marked / 2.0**n_bits))
+
+
+def optimal_iterations(n_bits, n_marked=1):
+    return int(np.floor(np.pi / (4 * angle(n_bits, n_marked))))
+
+
+def success_probability(n_bits, iterations, n_marked=1):
+    return np.sin((2 * iterations + 1) * angle(n_bits, n_marked))**2
+
+
+def _segments(ops):
+    # alternating runs of single qubit h / x (per qubit, in order) and multi-qubit gates
+    items = []
+    segment = {}
+    for op in ops:
+        if op.name == 'barrier':
+            continue
+        if op.name in ('h', 'x') and len(op.qubits) == 1:
+            segment.setdefault(op.qubits[0], []).append(op.name)
+        else:
+            items.append(segment)
+            items.append(op)
+            segment = {}
+    items.append(segment)
+    return items[0::2], items[1::2]
+
+
+def match(ops, n):
+    # recognizes grover_n style circuits after ancilla reduction:
+    #   x t, h on search qubits Q, h t,
+    #   k times: x mask, mcx(Q -> t) or mcz(Q), x mask, h x on Q, mcz(Q), x h on Q
+    # returns an Amplification or None
+    segments, gates = _segments(ops)
+    if not gates or len(gates) % 2 or any(op.params for op in gates):
+        return None
+
+    search = set(gates[1].qubits)
+    oracle = gates[0]
+    if oracle.name == 'mcx' and set(oracle.qubits[:-1]) == search:
+        target = oracle.qubits[-1]
+    elif oracle.name == 'mcz' and set(oracle.qubits) == search:
+        target = None
+    else:
+        return None
+
+    for i in range(0, len(gates), 2):
+        if gates[i].name != oracle.name or set(gates[i].qubits) != set(oracle.qubits) \
+                or (target is not None and gates[i].qubits[-1] != target) \
+                or gates[i + 1].name != 'mcz' or set(gates[i + 1].qubits) != search:
+            return None
+
+    first = dict(segments[0])
+    if target is not None and first.pop(target, None) != ['x', 'h']:
+        return None
+    if set(first.keys()) != search:
+        return None
+    flipped = set(q for q in search if first[q] == ['h', 'x'])
+    if any(first[q] != ['h'] for q in search - flipped):
+        return None
+
+    iterations = len(gates) // 2
+    for i in range(iterations):
+        middle, last = segments[2*i + 1], segments[2*i + 2]
+        if set(middle.keys()) != search or set(last.keys()) != search:
+            return None
+        for q in search:
+            if middle[q] != (['x'] if q in flipped else []) + ['h', 'x']:
+                return None
+            if last[q] != ['x', 'h'] + (['x'] if q in flipped and i < iterations - 1 else []):
+                return None
+
+    qubits = search | (set([target]) if target is not None else set())
+    if qubits != set(range(n)):
+        return None
+
+    marked = sum(1 << q for q in search - flipped)
+    return Amplification(n, sorted(search), marked, target, iterations)
+
+
+class Amplification(object):
+    # result of k iterations from the uniform superposition, with the phase kickback
+    # target (if any) left in |->; the diffusion here is H X mcz X H = -(2|s><s| - I),
+    # so every iteration also contributes a global sign
+    def __init__(self, n, search, marked, target, iterations, qubits=None, n_qubits=None):
+        self.n = n
+        self.search = search
+        self.marked = marked
+        self.target = target
+        self.iterations = iterations
+        self.qubits = qubits
+        self.n_qubits = n if n_qubits is None else n_qubits
+        self.counts = None
+        self._state = None
+
+        theta = angle(len(search))
+        sign = (-1)**iterations
+        self.marked_amplitude = sign * np.sin((2*iterations + 1) * theta)
+        self.unmarked_amplitude = sign * np.cos((2*iterations + 1) * theta) / np.sqrt(2.0**len(search) - 1)
+
+    @property
+    def state(self):
+        if self._state is None:
+            index = np.arange(2**self.n)
+            mask = sum(1 << q for q in self.search)
+            amp = np.where((index & mask) == self.marked, self.marked_amplitude, self.unmarked_amplitude)
+            if self.target is not None:
+                amp = amp * np.where((index >> self.target) & 1, -1, 1) / np.sqrt(2)
+            self._state = amp.astype(complex).reshape((2,) * self.n)
+        return self._state
+
+    def success_probability(self):
+        return self.marked_amplitude**2
+
+    def _marked(self):
+        # marked outcomes and the factor the target qubit contributes to their amplitude
+        if self.target is None:
+            return np.array([self.marked]), np.array([1.0])
+        return np.array([self.marked, self.marked | (1 << self.target)]), np.array([1, -1]) / np.sqrt(2)
+
+    def _histogram(self, indices, values):
+        keep = values != 0
+        keys, n = results.basis_keys(indices[keep], self.n, True, self.qubits, self.n_qubits)
+        return results.Histogram(keys, values[keep], n)
+
+    @profiler.timed('histogram')
+    def probabilities(self, decimals=5):
+        indices, factors = self._marked()
+        if np.round(np.round(self.unmarked_amplitude * factors[0], decimals)**2, decimals) == 0:
+            # only the marked outcomes survive rounding, the others are never built
+            amplitudes = np.round(self.marked_amplitude * factors, decimals)
+            return self._histogram(indices, np.round(amplitudes**2, decimals))
+        return results.probabilities(np.round(self.state, decimals), decimals,
+                                     qubits=self.qubits, n_qubits=self.n_qubits)
+
+    @profiler.timed('histogram')
+    def amplitudes(self, decimals=5):
+        indices, factors = self._marked()
+        if np.round(self.unmarked_amplitude * factors[0], decimals) == 0:
+            return self._histogram(indices, np.round(self.marked_amplitude * factors, decimals).astype(complex))
+        return results.amplitudes(np.round(self.state, decimals), qubits=self.qubits, n_qubits=self.n_qubits)
+
+    def support(self, tol=results.TOL):
+        indices, factors = self._marked()
+        if abs(self.unmarked_amplitude * factors[0]) > tol:
+            state = self.state.reshape(-1)
+            return results.support(np.arange(len(state)), state, self.n, tol, self.qubits, self.n_qubits)
+        amplitudes = self.marked_amplitude * factors
+        return results.support(indices, amplitudes, self.n, tol, self.qubits, self.n_qubits)
+
+    def support_size(self, tol=results.TOL):
+        # counted from the two amplitudes, the state is never built
+        indices, factors = self._marked()
+        size = len(indices) if abs(self.marked_amplitude * factors[0]) > tol else 0
+        if abs(self.unmarked_amplitude * factors[0]) > tol:
+            size += len(indices) * (2**len(self.search) - 1)
+        return size
+
+    def get_statevector(self, qc=None):
+        full = np.zeros(2**self.n_qubits, dtype=complex)
+        state = self.state.reshape(-1)
+        positions = np.arange(len(state)) if self.qubits is None else results.deposit(np.arange(len(state)), self.qubits)
+        full[positions] = state
+        return full
+
+    def get_counts(self, qc=None):
+        return self.counts
+
+    def get_data(self, qc=None):
+        return {'statevector': self.get_statevector(qc)}
@@ -0,0 +1,141 @@
+from circuit import Op
+
+# Clean ancilla elimination for compute / copy / uncompute ladders like util.controlled.
+#
+# An ancilla is clean when it starts in |0>, is only ever the target of X-type gates
+# (x with controls) that store the AND of other qubits and later erase it again, and
+# ends in |0>. While it holds a value it can only be used as a control, so every use
+# is replaced by a multi-controlled gate on the qubits the value was computed from
+# and the ancilla itself is never allocated.
+
+_X = ('cx', 'ccx', 'mcx')
+_Z = ('cz', 'mcz')
+
+# gates that never change the computational basis value of any of their qubits
+_DIAGONAL = ('barrier', 'id', 'iden', 'z', 's', 'sdg', 't', 'tdg', 'rz', 'u1',
+             'cz', 'crz', 'cu1', 'mcz')
+
+# gates that keep the value of their control qubits, which come first
+_CONTROLS = {'cx': 1, 'CX': 1, 'cy': 1, 'ch': 1, 'cu3': 1, 'ccx': 2}
+
+
+def _n_controls(op):
+    if op.name == 'mcx':
+        return len(op.qubits) - 1
+    return _CONTROLS.get(op.name, 0)
+
+
+def _modified(op):
+    if op.name in _DIAGONAL:
+        return ()
+    return op.qubits[_n_controls(op):]
+
+
+def _candidates(ops, n):
+    # qubits that are untouched, or first used as the target of an X-type gate
+    first = {}
+    for op in ops:
+        if op.name == 'barrier':
+            continue
+        for q in op.qubits:
+            if q not in first:
+                first[q] = op
+
+    candidates = set(q for q in range(n) if q not in first)
+    for q, op in first.items():
+        if op.name in _X and op.qubits[-1] == q:
+            candidates.add(q)
+
+    for op in ops:
+        if op.name in ('measure', 'reset', 'initialize'):
+            candidates.difference_update(op.qubits)
+    return candidates
+
+
+def _rewrite(ops, clean):
+    # returns (rewritten ops, None) or (None, ancillas to give up on)
+    value = dict((a, None) for a in clean)
+    out = []
+
+    def literals(qubits):
+        controls = set()
+        for q in qubits:
+            if q in clean:
+                if value[q] is None:
+                    return None
+                controls |= value[q]
+            else:
+                controls.add(q)
+        return controls
+
+    for op in ops:
+        touched = [q for q in op.qubits if q in clean]
+
+        modified = _modified(op)
+        if modified:
+            live = dict((q, a) for a in clean if value[a] for q in value[a])
+            broken = set(live[q] for q in modified if q in live)
+            if broken:
+                return None, broken
+
+        if not touched:
+            out.append(op)
+            continue
+
+        if op.name == 'barrier':
+            # ancillas are never allocated, the barrier keeps to the other qubits
+            kept = tuple(q for q in op.qubits if q not in clean)
+            if kept:
+                out.append(op._replace(qubits=kept))
+            continue
+
+        if op.name in _X and op.qubits[-1] in clean:
+            a = op.qubits[-1]
+            controls = literals(op.qubits[:-1])
+            if controls is None:
+                continue  # a control holds 0, the gate does nothing
+            if value[a] is None:
+                value[a] = frozenset(controls)
+            elif value[a] == controls:
+                value[a] = None
+            else:
+                return None, set([a])
+            continue
+
+        if op.name in _X and op.qubits[-1] not in clean:
+            controls = literals(op.qubits[:-1])
+            if controls is None:
+                continue
+            if op.qubits[-1] in controls:
+                return None, set(touched)
+            out.append(Op('mcx', tuple(sorted(controls)) + (op.qubits[-1],), (), ()))
+            continue
+
+        if op.name in _Z:
+            controls = literals(op.qubits)
+            if controls is None:
+                continue
+            out.append(Op('mcz', tuple(sorted(controls)), (), ()))
+            continue
+
+        return None, set(touched)
+
+    dirty = set(a for a in clean if value[a] is not None)
+    if dirty:
+        return None, dirty
+    return out, None
+
+
+def reduce(ops, n):
+    # returns (ops on the kept qubits renumbered from 0, kept qubit positions)
+    clean = _candidates(ops, n)
+    while True:
+        out, broken = _rewrite(ops, clean)
+        if out is not None:
+            break
+        clean -= broken
+
+    kept = [q for q in range(n) if q not in clean]
+    position = dict((q, i) for i, q in enumerate(kept))
+    reduced = [Op(op.name, tuple(position[q] for q in op.qubits), op.params, op.clbits) for op in out]
+    return reduced, kept
@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+
+import circuit
+import Qconfig
+import qobj_cache
+import results
+from session import session_for
+import statevector
+
+# Many circuits as a few remote jobs: circuits are grouped into batches, one job each,
+# at most max_in_flight jobs are queued at a time, and every job is polled with an
+# exponential backoff. submit returns one future per circuit that resolves to its counts.
+#
+# Blocking backend calls (submit / done / counts) run in the loop's executor. A client is
+# anything with those three methods: QiskitClient for a Qconfig entry, FakeServer to
+# test offline.
+
+# backend name in Qconfig that selects the fake server
+FAKE_BACKEND = 'fake_remote_simulator'
+
+
+class QiskitClient(object):
+    def __init__(self, cfg, backend=None, session=None):
+        session = session_for(cfg, session)
+        self.name = session.backend_name(backend)
+        self.backend = session.backend(self.name)
+        self.coupling_map = session.coupling_map(self.name)
+        self.basis_gates = session.basis_gates(self.name)
+        self._ids = itertools.count()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, circuits, shots):
+        # each circuit is compiled through the qobj cache, the batch is one qobj
+        qobjs = [qobj_cache.compile(circuit.to_qiskit(qc), self.name, self.coupling_map, shots=shots,
+                                    basis_gates=self.basis_gates) for qc in circuits]
+        qobj = dict(qobjs[0], circuits=[c for q in qobjs for c in q['circuits']])
+        job = self.backend.run(qobj)
+        with self._lock:
+            key = next(self._ids)
+            self._jobs[key] = job
+        return key
+
+    def done(self, key):
+        done = self._jobs[key].done
+        return done() if callable(done) else done
+
+    def counts(self, key, circuits):
+        with self._lock:
+            job = self._jobs.pop(key)
+        result = job.result()
+        return [results.from_counts(result.get_counts(qc.name)) for qc in circuits]
+
+
+class FakeServer(object):
+    # a remote backend in process: jobs are done latency seconds (plus jitter) after
+    # submission and run on the numpy engine
+    def __init__(self, latency=1.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.submitted = 0
+        self.polls = 0
+        self._ids = itertools.count()
+        self._jobs = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def submit(self, circuits, shots):
+        with self._lock:
+            key = next(self._ids)
+            ready = time.time() + self.latency + self._random.uniform(0, self.jitter)
+            self._jobs[key] = (ready, list(circuits), shots)
+            self.submitted += 1
+        return key
+
+    def done(self, key):
+        with self._lock:
+            self.polls += 1
+            return time.time() >= self._jobs[key][0]
+
+    def counts(self, key, circuits):
+        with self._lock:
+            _, circuits, shots = self._jobs.pop(key)
+        return [statevector.run(qc, shots).get_counts() for qc in circuits]
+
+
+def client(cfg, backend=None, session=None):
+    cfg = Qconfig.cfg[cfg]
+    if (backend or cfg['backend']) == FAKE_BACKEND:
+        return FakeServer(cfg.get('latency', 1.0), cfg.get('jitter', 0.0))
+    return QiskitClient(cfg, backend, session)
+
+
+async def _job(client, circuits, shots, slots, poll, max_poll):
+    loop = asyncio.get_event_loop()
+    async with slots:
+        key = await loop.run_in_executor(None, client.submit, circuits, shots)
+        delay = poll
+        while not await loop.run_in_executor(None, client.done, key):
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, max_poll)
+        return await loop.run_in_executor(None, client.counts, key, circuits)
+
+
+async def _pick(job, i):
+    return (await job)[i]
+
+
+def submit(circuits, client, shots=1024, batch_size=20, max_in_flight=4, poll=0.5, max_poll=30.0):
+    # has to be called from a running event loop; a failed job fails its circuits' futures
+    slots = asyncio.Semaphore(max_in_flight)
+    futures = []
+    for start in range(0, len(circuits), batch_size):
+        batch = circuits[start:start + batch_size]
+        job = asyncio.ensure_future(_job(client, batch, shots, slots, poll, max_poll))
+        futures.extend(asyncio.ensure_future(_pick(job, i)) for i in range(len(batch)))
+    return futures
+
+
+def get_counts(circuits, cfg, backend=None, shots=1024, session=None, **options):
+    # blocking front end: counts of every circuit, in order
+    remote = client(cfg, backend, session)
+
+    async def gather():
+        return await asyncio.gather(*submit(circuits, remote, shots, **options))
+    return asyncio.run(gather())
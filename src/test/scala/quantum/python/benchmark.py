@@ -0,0 +1,215 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+
+from circuit import QuantumCircuit, QuantumRegister
+import fib
+import fourier
+import grover_n
+import statevector
+
+# Benchmarks over the circuit families of this directory. Every workload runs as stages
+# (build, compile, simulate, histogram for circuits; build, simulate for parameter sweeps),
+# each stage timed on its own: best of repeat runs for wall time, then one more run under
+# tracemalloc for the peak memory the stage allocates. The numpy engine runs without its
+# prefix cache, so repeats simulate again instead of hitting the cache.
+#
+#   python benchmark.py --family fib --family qft --output run.json
+#   python benchmark.py --save-baseline baseline.json
+#   python benchmark.py --baseline baseline.json     # exits with 1 on regressions
+#
+# The JSON report goes to --output (stdout by default), progress goes to stderr.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# a stage is a regression when it is this many times slower than the baseline
+TOLERANCE = 1.25
+
+# stages faster than this in the baseline are timer noise and never compared
+MIN_SECONDS = 1e-3
+
+# angle points per state_ry / state_rz sweep
+SWEEP_POINTS = [10, 100, 1000, 10000, 100000]
+
+
+def _script(path, name):
+    # the state_* directories hold scripts with the same names, load them by path
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _grover(n):
+    qc, _, _ = grover_n.build_circuit(n, 2**n - 1)
+    return qc
+
+
+def _fib(n):
+    qc, q, c = fib.build_circuit(n)
+    qc.measure(q, c)
+    return qc
+
+
+def _qft(n):
+    q = QuantumRegister(n)
+    qc = QuantumCircuit(q)
+    fourier.qft(qc, q)
+    return qc
+
+
+def _circuit(build, shots=1, amplify=False):
+    # amplify=False simulates Grover gate by gate instead of in closed form
+    return [('build', build),
+            ('compile', lambda qc: statevector.compile(qc, amplify=amplify)),
+            ('simulate', lambda program: statevector.execute(program, shots, seed=0, cache=None)),
+            ('histogram', lambda result: result.probabilities(5))]
+
+
+def _sweep(path, name):
+    def build(points):
+        import sweep
+        module = _script(path, name)
+        theta, phi = sweep.parameters('theta phi')
+        qc, _, _ = module.build_circuit(theta, phi)
+        return qc, {theta: np.linspace(0, np.pi, points), phi: 0.321}
+
+    def simulate(built):
+        import sweep
+        return sweep.probs(*built)
+    return [('build', build), ('simulate', simulate)]
+
+
+# families whose sizes are sweep points instead of qubits
+SWEEPS = ('state_ry', 'state_rz')
+
+# family -> (sizes, stages); a size is the number of qubits, or of sweep points
+WORKLOADS = OrderedDict([
+    ('grover', (range(3, 13), _circuit(_grover))),
+    ('grover_closed_form', (range(3, 13), _circuit(_grover, amplify=True))),
+    ('fib', (range(1, 21), _circuit(_fib, 1024))),
+    ('qft', (range(3, 25), _circuit(_qft))),
+    ('state_ry', (SWEEP_POINTS, _sweep('state_ry/single_qbit_state.py', 'state_ry_single_qbit_state'))),
+    ('state_rz', (SWEEP_POINTS, _sweep('state_rz/single_qbit_state.py', 'state_rz_single_qbit_state'))),
+])
+
+
+def _gates(family, size, built):
+    # a sweep applies every gate once per point
+    if family in SWEEPS:
+        qc, values = built
+        return len(qc.data) * size
+    return len(built.data)
+
+
+def measure(family, size, stages, repeat=3):
+    seconds = dict((name, float('inf')) for name, _ in stages)
+    peaks = {}
+    for run in range(repeat + 1):
+        traced = run == repeat
+        value = size
+        for name, stage in stages:
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            value = stage(value)
+            elapsed = time.perf_counter() - start
+            if traced:
+                peaks[name] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                seconds[name] = min(seconds[name], elapsed)
+            if name == 'build':
+                gates = _gates(family, size, value)
+
+    report = OrderedDict()
+    for name, _ in stages:
+        report[name] = OrderedDict([('seconds', seconds[name])])
+        if name == 'simulate':
+            # the only stage whose work grows with the gates applied
+            report[name]['gates_per_second'] = gates / seconds[name] if seconds[name] > 0 else None
+        report[name]['peak_bytes'] = peaks[name]
+    return OrderedDict([('family', family), ('size', size), ('gates', gates), ('stages', report)])
+
+
+def run(families=None, max_size=None, repeat=3, log=sys.stderr, max_points=None):
+    # max_size limits qubit counts, max_points the points of the sweeps
+    records = []
+    for family in families or WORKLOADS.keys():
+        sizes, stages = WORKLOADS[family]
+        limit = max_points if family in SWEEPS else max_size
+        for size in sizes:
+            if limit is not None and size > limit:
+                continue
+            record = measure(family, size, stages, repeat)
+            if log is not None:
+                print("%-18s %6d %9d gates  %s" % (family, size, record['gates'], "  ".join(
+                    "%s %.4fs" % (name, s['seconds']) for name, s in record['stages'].items())), file=log)
+            records.append(record)
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('machine', platform.machine()),
+        ('processor', platform.processor()),
+        ('results', records)])
+
+
+def compare(report, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS):
+    # (family, size, stage, baseline seconds, seconds) of every stage that got slower
+    before = dict(((r['family'], r['size']), r['stages']) for r in baseline['results'])
+    regressions = []
+    for r in report['results']:
+        stages = before.get((r['family'], r['size']), {})
+        for name, s in r['stages'].items():
+            if name not in stages or stages[name]['seconds'] < min_seconds:
+                continue
+            if s['seconds'] > tolerance * stages[name]['seconds']:
+                regressions.append((r['family'], r['size'], name, stages[name]['seconds'], s['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the circuit families on the numpy engine.")
+    parser.add_argument('--family', action='append', choices=list(WORKLOADS.keys()),
+                        help="family to run, can be repeated (default: all)")
+    parser.add_argument('--max-size', type=int, help="skip circuits of more qubits than this")
+    parser.add_argument('--max-points', type=int, help="skip sweeps of more points than this")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per workload, the best one counts")
+    parser.add_argument('--output', help="JSON report path (default: stdout)")
+    parser.add_argument('--baseline', help="compare against this report")
+    parser.add_argument('--save-baseline', help="also write the report here")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = run(args.family, args.max_size, args.repeat, max_points=args.max_points)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for family, size, stage, before, now in regressions:
+            print("regression: %s %d %s %.4fs -> %.4fs (x%.2f)" % (family, size, stage, before, now, now / before),
+                  file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import numpy as np
+
+from circuit import Op
+import results
+
+# Tagged gate blocks the engine runs as a whole instead of gate by gate.
+#
+# 'qft' / 'iqft' are exactly the h + crz sequences of fourier.qft / fourier.iqft on
+# the listed qubits. With x, y little endian over those qubits:
+#   qft |x> = D(x)/sqrt(M) * sum_y exp(2*pi*i*rev(x)*y/M) |y>
+# where crz (unlike cu1) leaves the phase D(x) = prod_k exp(-i*pi*(1/2 - 2^-(k+1)))^x_k,
+# so the block is one bit reversal plus an inverse FFT; iqft is its exact inverse.
+
+
+def _expand_qft(qubits):
+    ops = []
+    for j in range(len(qubits)):
+        ops.append(Op('h', (qubits[j],), (), ()))
+        for k in range(j + 1, len(qubits)):
+            ops.append(Op('crz', (qubits[k], qubits[j]), (np.pi/float(2**(k - j)),), ()))
+    return ops
+
+
+def _expand_iqft(qubits):
+    ops = []
+    for j in reversed(range(len(qubits))):
+        ops.append(Op('h', (qubits[j],), (), ()))
+        for k in reversed(range(j)):
+            ops.append(Op('crz', (qubits[j], qubits[k]), (-np.pi/float(2**(j - k)),), ()))
+    return ops
+
+
+def _phases(m):
+    index = np.arange(2**m)
+    phase = np.zeros(2**m)
+    for k in range(m):
+        phase -= ((index >> k) & 1) * np.pi * (0.5 - 2.0**-(k + 1))
+    return np.exp(1j * phase)
+
+
+def _along(state, qubits, f):
+    # runs f over the last axis of a view where the block's qubits form a little endian index
+    m = len(qubits)
+    axes = [state.ndim - 1 - q for q in reversed(qubits)]
+    moved = np.moveaxis(state, axes, list(range(state.ndim - m, state.ndim)))
+    shape = moved.shape
+    out = f(moved.reshape(shape[:state.ndim - m] + (2**m,)))
+    return np.moveaxis(out.reshape(shape), list(range(state.ndim - m, state.ndim)), axes)
+
+
+def qft(state, qubits):
+    m = len(qubits)
+    rev = results.bit_reverse(np.arange(2**m), m)
+    return _along(state, qubits, lambda a: np.fft.ifft((a * _phases(m))[..., rev], axis=-1, norm='ortho'))
+
+
+def iqft(state, qubits):
+    m = len(qubits)
+    rev = results.bit_reverse(np.arange(2**m), m)
+    return _along(state, qubits, lambda a: np.fft.fft(a, axis=-1, norm='ortho')[..., rev] * np.conj(_phases(m)))
+
+
+KERNELS = {
+    'qft': qft,
+    'iqft': iqft
+}
+
+_EXPANSIONS = {
+    'qft': _expand_qft,
+    'iqft': _expand_iqft
+}
+
+
+def _same(ops, expected):
+    if len(ops) != len(expected):
+        return False
+    for op, ref in zip(ops, expected):
+        if op.name != ref.name or op.qubits != ref.qubits or len(op.params) != len(ref.params):
+            return False
+        try:
+            if not np.allclose([float(p) for p in op.params], ref.params):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def collapse(ops, tags):
+    # replaces tagged ranges that really hold the expected gates by a single block op
+    result = []
+    position = 0
+    for name, qubits, start, end in sorted(tags, key=lambda t: t[2]):
+        if start < position or name not in _EXPANSIONS:
+            continue
+        if not _same(ops[start:end], _EXPANSIONS[name](qubits)):
+            continue
+        result.extend(ops[position:start])
+        result.append(Op(name, tuple(qubits), (), ()))
+        position = end
+    result.extend(ops[position:])
+    return result
+
+
+def expand(ops, fits):
+    # block ops for which fits(op) is False back as their gates, for engines that can
+    # only apply a block within a bounded set of qubits
+    result = []
+    for op in ops:
+        if op.name in _EXPANSIONS and not fits(op):
+            result.extend(_EXPANSIONS[op.name](list(op.qubits)))
+        else:
+            result.append(op)
+    return result
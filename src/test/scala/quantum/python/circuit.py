@@ -0,0 +1,269 @@
+import hashlib
+import heapq
+import itertools
+from collections import OrderedDict, namedtuple
+
+# flat view of a circuit: global qubit / clbit indices in register order,
+# qubit 0 of the first register is the least significant bit of a basis index
+Op = namedtuple('Op', ['name', 'qubits', 'params', 'clbits'])
+
+
+# Circuits without QISKit: registers and circuits with the subset of the QISKit 0.5 API
+# the scripts use (regs, data, name, gate methods that also take whole registers), so the
+# local engines run without importing qiskit. to_qiskit rebuilds one for QISKit backends.
+
+class Register(object):
+    prefix = 'r'
+    _ids = itertools.count()
+
+    def __init__(self, size, name=None):
+        self.size = size
+        self.name = name if name is not None else self.prefix + str(next(Register._ids))
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError("register index out of range: %d" % i)
+        return self, i
+
+    def __len__(self):
+        return self.size
+
+
+class QuantumRegister(Register):
+    prefix = 'q'
+
+
+class ClassicalRegister(Register):
+    prefix = 'c'
+
+
+class Instruction(object):
+    def __init__(self, name, param, arg):
+        self.name = name
+        self.param = list(param)
+        self.arg = list(arg)
+        self.control = None
+
+
+# gate name -> (number of parameters, number of qubits)
+GATES = {
+    'id': (0, 1), 'iden': (0, 1), 'x': (0, 1), 'y': (0, 1), 'z': (0, 1), 'h': (0, 1),
+    's': (0, 1), 'sdg': (0, 1), 't': (0, 1), 'tdg': (0, 1),
+    'rx': (1, 1), 'ry': (1, 1), 'rz': (1, 1), 'u1': (1, 1), 'u2': (2, 1), 'u3': (3, 1),
+    'cx': (0, 2), 'cy': (0, 2), 'cz': (0, 2), 'ch': (0, 2), 'swap': (0, 2),
+    'crz': (1, 2), 'cu1': (1, 2), 'cu3': (3, 2),
+    'ccx': (0, 3)
+}
+
+
+def _bits(args):
+    # registers are applied bit by bit, together with single bits or same sized registers
+    sizes = set(a.size for a in args if isinstance(a, Register))
+    if not sizes:
+        return [list(args)]
+    if len(sizes) > 1:
+        raise ValueError("registers of different sizes")
+    return [[a[i] if isinstance(a, Register) else a for a in args] for i in range(sizes.pop())]
+
+
+class QuantumCircuit(object):
+    _ids = itertools.count()
+
+    def __init__(self, *regs, **kwargs):
+        self.regs = OrderedDict()
+        self.data = []
+        self.name = kwargs.get('name') or 'circuit' + str(next(QuantumCircuit._ids))
+        self.add(*regs)
+
+    def add(self, *regs):
+        for r in regs:
+            self.regs[r.name] = r
+
+    def _attach(self, instruction):
+        self.data.append(instruction)
+        return instruction
+
+    def _gate(self, name, params, args):
+        for bits in _bits(args):
+            self._attach(Instruction(name, params, bits))
+        return self
+
+    def measure(self, q, c):
+        return self._gate('measure', [], [q, c])
+
+    def reset(self, q):
+        return self._gate('reset', [], [q])
+
+    def barrier(self, *args):
+        qubits = []
+        for a in args or [r for r in self.regs.values() if isinstance(r, QuantumRegister)]:
+            qubits.extend([a[i] for i in range(a.size)] if isinstance(a, Register) else [a])
+        return self._attach(Instruction('barrier', [], qubits))
+
+    def initialize(self, params, qubits):
+        if isinstance(qubits, Register):
+            qubits = [qubits[i] for i in range(qubits.size)]
+        return self._attach(Instruction('initialize', params, qubits))
+
+
+def _method(name, n_params, n_qubits):
+    def gate(self, *args):
+        if len(args) != n_params + n_qubits:
+            raise TypeError("%s takes %d parameters and %d qubits" % (name, n_params, n_qubits))
+        return self._gate(name, args[:n_params], args[n_params:])
+    gate.__name__ = name
+    return gate
+
+
+for _name, (_n_params, _n_qubits) in GATES.items():
+    setattr(QuantumCircuit, _name, _method(_name, _n_params, _n_qubits))
+
+
+def to_qiskit(qc):
+    # the same circuit built with QISKit, for its compiler and backends
+    import qiskit
+    if isinstance(qc, qiskit.QuantumCircuit):
+        return qc
+
+    regs = OrderedDict()
+    for r in qc.regs.values():
+        kind = qiskit.QuantumRegister if isinstance(r, QuantumRegister) else qiskit.ClassicalRegister
+        regs[r.name] = kind(r.size, r.name)
+    out = qiskit.QuantumCircuit(*regs.values())
+    out.name = qc.name
+
+    for inst in qc.data:
+        args = [regs[reg.name][i] for reg, i in inst.arg]
+        if inst.name == 'initialize':
+            out.initialize(inst.param, args)
+        elif inst.name == 'barrier':
+            out.barrier(*args)
+        elif inst.name in ('measure', 'reset') or inst.name in GATES:
+            getattr(out, inst.name)(*(list(inst.param) + args))
+        else:
+            raise ValueError("gate only runs on the local engines: " + inst.name)
+    return out
+
+
+def _values(regs):
+    return list(regs.values()) if hasattr(regs, 'values') else list(regs)
+
+
+def registers(qc):
+    if hasattr(qc, 'qregs'):
+        return _values(qc.qregs), _values(qc.cregs)
+
+    regs = _values(qc.regs)
+    qregs = [r for r in regs if type(r).__name__ == 'QuantumRegister']
+    cregs = [r for r in regs if type(r).__name__ == 'ClassicalRegister']
+    return qregs, cregs
+
+
+def _offsets(regs):
+    offsets = {}
+    total = 0
+    for r in regs:
+        offsets[r.name] = total
+        total += r.size
+    return offsets, total
+
+
+def num_qubits(qc):
+    qregs, _ = registers(qc)
+    return sum(r.size for r in qregs)
+
+
+def num_clbits(qc):
+    _, cregs = registers(qc)
+    return sum(r.size for r in cregs)
+
+
+def creg_sizes(qc):
+    _, cregs = registers(qc)
+    return [r.size for r in cregs]
+
+
+def ops(qc):
+    if hasattr(qc, 'to_ops'):
+        # ir.Circuit keeps its gates in arrays
+        return qc.to_ops()
+
+    qregs, cregs = registers(qc)
+    q_offsets, _ = _offsets(qregs)
+    c_offsets, _ = _offsets(cregs)
+
+    result = []
+    for inst in qc.data:
+        if getattr(inst, 'control', None) is not None:
+            raise ValueError("classically controlled gates are not supported: " + inst.name)
+
+        qubits = []
+        clbits = []
+        for reg, i in inst.arg:
+            if reg.name in q_offsets and type(reg).__name__ == 'QuantumRegister':
+                qubits.append(q_offsets[reg.name] + i)
+            else:
+                clbits.append(c_offsets[reg.name] + i)
+
+        name = 'initialize' if inst.name == 'init' else inst.name
+        result.append(Op(name, tuple(qubits), tuple(inst.param), tuple(clbits)))
+
+    return result
+
+
+def tags(qc):
+    # blocks recorded by util.block: (name, qubit indices, first op, end op)
+    qregs, _ = registers(qc)
+    offsets, _ = _offsets(qregs)
+    return [(name, [offsets[reg.name] + i for reg, i in qubits], start, end)
+            for name, qubits, start, end in getattr(qc, 'blocks', [])]
+
+
+def canonical(ops):
+    # a topological order of the gate dependency graph, lowest highest qubit first;
+    # gates on disjoint qubits commute, so this gives the same result as ops
+    last = {}
+    waiting = [0] * len(ops)
+    followers = [[] for _ in ops]
+    for i, op in enumerate(ops):
+        before = set(last[q] for q in op.qubits if q in last)
+        before |= set(last[('c', c)] for c in op.clbits if ('c', c) in last)
+        for j in before:
+            followers[j].append(i)
+        waiting[i] = len(before)
+        for q in op.qubits:
+            last[q] = i
+        for c in op.clbits:
+            last[('c', c)] = i
+
+    ready = [(max(op.qubits) if op.qubits else -1, i) for i, op in enumerate(ops) if not waiting[i]]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, i = heapq.heappop(ready)
+        order.append(ops[i])
+        for j in followers[i]:
+            waiting[j] -= 1
+            if not waiting[j]:
+                heapq.heappush(ready, (max(ops[j].qubits) if ops[j].qubits else -1, j))
+    return order
+
+
+def param_repr(p):
+    if hasattr(p, 'tobytes'):
+        # fused gate matrices
+        return p.tobytes().hex()
+    try:
+        return repr(complex(p))
+    except TypeError:
+        return str(p)
+
+
+def fingerprint(qc):
+    # structural hash: register sizes and the gate sequence, independent of register names
+    qregs, cregs = registers(qc)
+    h = hashlib.sha256()
+    h.update(repr(([r.size for r in qregs], [r.size for r in cregs])).encode())
+    for op in ops(qc):
+        h.update(repr((op.name, op.qubits, [param_repr(p) for p in op.params], op.clbits)).encode())
+    return h.hexdigest()
@@ -1,4 +1,4 @@
-from qiskit import QuantumRegister, QuantumCircuit
+from circuit import QuantumRegister, QuantumCircuit
 
 # https://quantumcomputing.stackexchange.com/questions/2177/how-can-i-implement-an-n-bit-toffoli-gate
 def build_circuit(ctrl, tgt, cc_gate, c_gate):
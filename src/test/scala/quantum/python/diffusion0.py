@@ -1,6 +1,4 @@
-# importing QISKit
-from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister
-from qiskit.tools import visualization
+from circuit import QuantumCircuit, ClassicalRegister, QuantumRegister
 import util
 
 
@@ -29,4 +27,5 @@ def build_circuit():
 if __name__ == "__main__":
     hist = util.get_probs(build_circuit(), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
@@ -0,0 +1,282 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import blocks
+import outofcore
+import results
+import statevector
+from circuit import Op
+
+# Statevector sharded over worker processes. With 2^g shards the top g qubit positions
+# are global (they pick the shard) and the other L are local to a shard; each shard is a
+# multiprocessing.shared_memory block that its workers attach to once.
+#
+# Gates that only change local positions run on every shard at once, batched until the
+# next gate that would change a global one. Controls on global positions (mcx, mcz,
+# diagonal gates) are fixed per shard, as in outofcore. Before a gate that changes a
+# global position, that position is swapped with a local one: shard pairs differing in
+# the global bit trade the halves where the local bit disagrees, and a layout records
+# where every logical qubit now lives. Shards only meet in these pairwise exchanges, so
+# the same protocol can later run over sockets between hosts.
+#
+# The final state stays sharded: sampling, probabilities and support run per shard in
+# the workers, which undo the layout for their own amplitudes, and only
+# Result.get_statevector gathers the dense state into one process.
+
+BACKENDS = ['local_shared_simulator']
+
+# fewest local qubits a shard keeps
+MIN_LOCAL = 4
+
+# worker side: shard -> amplitudes in shared memory
+_shards = {}
+
+
+def _attach(names, size):
+    for shard, name in enumerate(names):
+        block = shared_memory.SharedMemory(name=name)
+        _shards[shard] = (block, np.ndarray((size,), dtype=complex, buffer=block.buf))
+
+
+def _apply(args):
+    shard, n_local, ops = args
+    state = _shards[shard][1]
+    local = state.reshape((2,) * n_local)
+    for op in ops:
+        for specialized in outofcore.specialize(op, shard << n_local, n_local, []):
+            local = statevector.step(local, specialized)
+    if not np.may_share_memory(local, state):
+        state[:] = local.reshape(-1)
+
+
+def _exchange(args):
+    # a has the global bit 0, b has it 1: a's half with the local bit 1 trades places
+    # with b's half with the local bit 0
+    a, b, position = args
+    va = _shards[a][1].reshape(-1, 2, 2**position)[:, 1, :]
+    vb = _shards[b][1].reshape(-1, 2, 2**position)[:, 0, :]
+    saved = va.copy()
+    va[...] = vb
+    vb[...] = saved
+
+
+def _place(op, physical):
+    # op on the physical positions of its qubits; a diagonal's phases are reindexed so
+    # its qubits stay ascending
+    qubits = tuple(physical[q] for q in op.qubits)
+    if op.name != 'diagonal':
+        return op._replace(qubits=qubits)
+    ordered = tuple(sorted(qubits))
+    index = np.arange(2**len(qubits))
+    old = np.zeros_like(index)
+    for j, p in enumerate(qubits):
+        old |= ((index >> ordered.index(p)) & 1) << j
+    return Op('diagonal', ordered, (op.params[0][old],), ())
+
+
+def _victim(ops, start, physical, n_local, busy):
+    # the local position whose qubit is needed again last
+    logical = dict((p, q) for q, p in physical.items())
+    candidates = [p for p in range(n_local) if p not in busy]
+    if not candidates:
+        raise ValueError("gate is wider than the local qubits of a shard")
+
+    def next_use(p):
+        for i in range(start, len(ops)):
+            if logical[p] in ops[i].qubits:
+                return i
+        return len(ops)
+    return max(candidates, key=next_use)
+
+
+def simulate(ops, n, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # a QFT block wider than a shard would keep every qubit local, it runs gate by gate
+    room = max(n - int(np.log2(workers)), MIN_LOCAL)
+    ops = blocks.expand(ops, lambda op: len(op.qubits) <= room)
+    widest = max([len(outofcore.active(op, 0)) for op in ops] + [MIN_LOCAL])
+    n_global = max(0, min(int(np.log2(workers)), n - widest))
+    n_local = n - n_global
+    shards = 2**n_global
+
+    segments = [shared_memory.SharedMemory(create=True, size=2**n_local * np.dtype(complex).itemsize)
+                for _ in range(shards)]
+    try:
+        for segment in segments:
+            np.ndarray((2**n_local,), dtype=complex, buffer=segment.buf)[:] = 0
+        np.ndarray((2**n_local,), dtype=complex, buffer=segments[0].buf)[0] = 1
+
+        physical = dict((q, q) for q in range(n))
+        with ProcessPoolExecutor(max_workers=shards, initializer=_attach,
+                                 initargs=([b.name for b in segments], 2**n_local)) as pool:
+            batch = []
+
+            def flush():
+                if batch:
+                    list(pool.map(_apply, [(shard, n_local, batch) for shard in range(shards)]))
+                    del batch[:]
+
+            for i, op in enumerate(ops):
+                placed = _place(op, physical)
+                remote = sorted(outofcore.active(placed, n_local))
+                if remote:
+                    flush()
+                    # positions the gate only reads may go global, they are fixed per shard
+                    busy = set(p for p in outofcore.active(placed, 0) if p < n_local)
+                    for p in remote:
+                        l = _victim(ops, i, physical, n_local, busy)
+                        busy.add(l)
+                        bit = 1 << (p - n_local)
+                        pairs = [(a, a | bit, l) for a in range(shards) if not a & bit]
+                        list(pool.map(_exchange, pairs))
+                        logical = dict((v, q) for q, v in physical.items())
+                        physical[logical[p]], physical[logical[l]] = l, p
+                    placed = _place(op, physical)
+                batch.append(placed)
+            flush()
+    except BaseException:
+        _release(segments)
+        raise
+    return Shards(segments, n, n_local, physical)
+
+
+def _release(segments):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+def _logical(shard, n_local, physical, offsets):
+    # logical indices of the amplitudes at the given offsets of a shard; logical qubit q
+    # is bit physical[q] of the shard's physical index
+    index = (np.int64(shard) << n_local) | np.asarray(offsets, dtype=np.int64)
+    logical = np.zeros_like(index)
+    for q, p in enumerate(physical):
+        logical |= ((index >> p) & 1) << q
+    return logical
+
+
+class Shards(object):
+    # a simulated state left in shared memory, shard s holding the amplitudes whose top
+    # physical positions read s; the segments are unlinked with the last reference
+    def __init__(self, segments, n, n_local, physical):
+        self.segments = segments
+        self.n = n
+        self.n_local = n_local
+        self.physical = tuple(physical[q] for q in range(n))
+        self._finalizer = weakref.finalize(self, _release, segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def view(self, shard):
+        return np.ndarray((2**self.n_local,), dtype=complex, buffer=self.segments[shard].buf)
+
+    def map(self, f, extra=None):
+        # f((shard, n_local, physical) + extra[shard]) for every shard, in attached workers
+        extra = extra or [()] * len(self)
+        tasks = [(shard, self.n_local, self.physical) + extra[shard] for shard in range(len(self))]
+        with ProcessPoolExecutor(max_workers=len(self), initializer=_attach,
+                                 initargs=([s.name for s in self.segments], 2**self.n_local)) as pool:
+            return list(pool.map(f, tasks))
+
+
+def _weight(args):
+    return float(np.sum(np.abs(_shards[args[0]][1])**2))
+
+
+def _sample(args):
+    shard, n_local, physical, measures, shots, seed = args
+    if not shots:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    p = np.abs(_shards[shard][1])**2
+    support = np.flatnonzero(p)
+    return statevector.draw(_logical(shard, n_local, physical, support), p[support], measures, shots,
+                            np.random.default_rng(seed))
+
+
+def _select(args):
+    shard, n_local, physical, kind, value = args
+    amplitudes = _shards[shard][1]
+    if kind == 'probabilities':
+        values = np.round(np.abs(np.round(amplitudes, value))**2, value)
+        keep = np.flatnonzero(values > 0)
+    elif kind == 'amplitudes':
+        values = np.round(amplitudes, value)
+        keep = np.flatnonzero(values)
+    else:
+        values = amplitudes
+        keep = np.flatnonzero(np.abs(amplitudes) > value)
+    return _logical(shard, n_local, physical, keep), values[keep]
+
+
+def sample(state, measures, shots, rng):
+    # shots are split over the shards by their total probability, then drawn inside each
+    weights = np.array(state.map(_weight))
+    per_shard = rng.multinomial(shots, weights / weights.sum())
+    seeds = rng.integers(2**63, size=len(state))
+    drawn = state.map(_sample, [(measures, int(k), int(seed)) for k, seed in zip(per_shard, seeds)])
+    return np.concatenate([o for o, _ in drawn]), np.concatenate([d for _, d in drawn])
+
+
+class Result(object):
+    # state is the Shards of the given qubits of an n_qubits register, the rest are |0>
+    def __init__(self, state, counts=None, qubits=None, n_qubits=None):
+        self.state = state
+        self.counts = counts
+        self.qubits = qubits
+        self.n = state.n
+        self.n_qubits = self.n if n_qubits is None else n_qubits
+
+    def _collect(self, kind, value):
+        parts = self.state.map(_select, [(kind, value)] * len(self.state))
+        return np.concatenate([i for i, _ in parts]), np.concatenate([v for _, v in parts])
+
+    def _histogram(self, indices, values):
+        keys, n = results.basis_keys(indices, self.n, True, self.qubits, self.n_qubits)
+        return results.Histogram(keys, values, n)
+
+    def get_statevector(self, qc=None):
+        # the only query that holds the whole state in this process
+        full = np.zeros(2**self.n_qubits, dtype=complex)
+        offsets = np.arange(2**self.state.n_local)
+        for shard in range(len(self.state)):
+            indices = _logical(shard, self.state.n_local, self.state.physical, offsets)
+            if self.qubits is not None:
+                indices = results.deposit(indices, self.qubits)
+            full[indices] = self.state.view(shard)
+        return full
+
+    def probabilities(self, decimals=5):
+        return self._histogram(*self._collect('probabilities', decimals))
+
+    def amplitudes(self, decimals=5):
+        return self._histogram(*self._collect('amplitudes', decimals))
+
+    def support(self, tol=results.TOL):
+        indices, values = self._collect('support', tol)
+        return results.support(indices, values, self.n, tol, self.qubits, self.n_qubits)
+
+    def support_size(self, tol=results.TOL):
+        return len(self._collect('support', tol)[0])
+
+    def get_counts(self, qc=None):
+        return self.counts
+
+    def get_data(self, qc=None):
+        data = {'statevector': self.get_statevector(qc)}
+        if self.counts is not None:
+            data['counts'] = self.counts
+        return data
+
+
+def run(qc, shots=1, seed=None, reduce_ancillas=True, workers=None):
+    program = statevector.compile(qc, reduce_ancillas, amplify=False)
+    state = simulate(statevector.unitary_part(program, 'shared memory'), program.n, workers)
+    counts = statevector.sampled_counts(program, state, shots, seed, sample)
+    return Result(state, counts, program.qubits, program.n_qubits)
@@ -1,9 +1,12 @@
 import numpy as np
 
-# importing QISKit
-from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister, compile, execute, register, available_backends, get_backend
-from qiskit.tools import visualization
+import circuit
+from circuit import QuantumCircuit, ClassicalRegister, QuantumRegister
 import Qconfig
+import qobj_cache
+from session import Session, session_for
+import sparse
+import statevector
 
 
 def cry(theta, qc, q_control, q_target):
@@ -28,36 +31,44 @@ def build_circuit(n):
     return qc, q, c
 
 
-def run(n, qc, cfg, backend = None):
-    if 'url' in cfg.keys():
-        register(cfg['token'], cfg['url'], cfg['hub'], cfg['group'], cfg['project'])
-        print(available_backends())
+def run(n, qc, cfg, backend = None, session = None):
+    session = session_for(cfg, session)
+    backend = session.backend_name(backend)
 
-    if backend is None:
-        backend = cfg['backend']
+    if backend in statevector.BACKENDS:
+        return statevector.run(qc, int(np.power(2, n + 2)))
+    if backend in sparse.BACKENDS:
+        return sparse.run(qc, int(np.power(2, n + 2)))
 
-    backend_config = get_backend(backend).configuration
-    backend_coupling = backend_config['coupling_map']
+    backend_coupling = session.coupling_map(backend)
 
-    qc_compiled = compile([qc], backend=backend, coupling_map=backend_coupling, seed=0)
-    qc_compiled_qasm = qc_compiled['circuits'][0]['compiled_circuit_qasm']
-    #print(qc_compiled_qasm)
+    qobj = qobj_cache.compile(circuit.to_qiskit(qc), backend, backend_coupling, seed=0, shots=int(np.power(2, n + 2)),
+                              basis_gates=session.basis_gates(backend))
+    #print(qobj['circuits'][0]['compiled_circuit_qasm'])
 
-    job = execute([qc], backend=backend, shots=int(np.power(2, n + 2)))
+    job = session.backend(backend).run(qobj)
     result = job.result()
 
     return result
 
 
-def get_counts(n, cfg, backend = None):
+def get_counts(n, cfg, backend = None, session = None):
     qc, qr, cr = build_circuit(n)
     qc.measure(qr, cr)
-    result = run(n, qc, Qconfig.cfg[cfg], backend)
+    result = run(n, qc, Qconfig.cfg[cfg], backend, session)
     counts = result.get_counts()
     # visualization.plot_circuit(qc)
     return counts
 
 
+# F(n) is the number of basis states in the superposition, read off the final state
+# exactly instead of counting the outcomes of 2^(n+2) shots
+def get_size(n, cfg, backend = None, session = None):
+    qc, _, _ = build_circuit(n)
+    result = run(n, qc, Qconfig.cfg[cfg], backend, session)
+    return result.support_size()
+
+
 def histogram(state):
     n = len(state)
     pow = int(np.log2(n))
@@ -70,18 +81,18 @@ def histogram(state):
     return filtered_hist
 
 
-def get_probs(n, cfg):
+def get_probs(n, cfg, session = None):
     qc, _, _ = build_circuit(n)
     # visualization.plot_circuit(qc)
-    result = run(n, qc, Qconfig.cfg[cfg], 'local_statevector_simulator')
-    state = np.round(result.get_data(qc)['statevector'], 5)
+    result = run(n, qc, Qconfig.cfg[cfg], 'local_statevector_simulator', session)
+    state = np.round(result.get_data(qc.name)['statevector'], 5)
     return histogram(state)
 
 
 if __name__ == "__main__":
+    session = Session(Qconfig.cfg['sparse'])
     for i in range(1, 10):
-        hist = get_counts(i, 'sim')
-        print("F(", i, ") = ", len(hist))
+        print("F(", i, ") = ", get_size(i, 'sparse', session=session))
         #visualization.plot_histogram(hist)
 
 # F( 1 ) =  2
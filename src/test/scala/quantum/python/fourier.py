@@ -1,24 +1,23 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 
 def qft(qc, q):
-    for j in range(len(q)):
-        qc.h(q[j])
-        for k in range(j + 1, len(q)):
-            qc.crz(np.pi/float(2**(k - j)), q[k], q[j])
+    with util.block(qc, 'qft', q):
+        for j in range(len(q)):
+            qc.h(q[j])
+            for k in range(j + 1, len(q)):
+                qc.crz(np.pi/float(2**(k - j)), q[k], q[j])
 
 
 def iqft(qc, q):
-    for j in reversed(range(len(q))):
-        qc.h(q[j])
-        for k in reversed(range(j)):
-            qc.crz(-np.pi/float(2**(j-k)), q[j], q[k])
+    with util.block(qc, 'iqft', q):
+        for j in reversed(range(len(q))):
+            qc.h(q[j])
+            for k in reversed(range(j)):
+                qc.crz(-np.pi/float(2**(j-k)), q[j], q[k])
 
 
 def build_circuit():
@@ -63,6 +62,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
 
 
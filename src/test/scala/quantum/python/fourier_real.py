@@ -1,10 +1,7 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import math
 import numpy as np
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 
@@ -0,0 +1,97 @@
+import numpy as np
+
+from circuit import Op
+
+# Gate fusion: consecutive gates on the same one or two qubits are multiplied into one
+# 2x2 / 4x4 'unitary' op, so cry(theta) = ry, cx, ry, cx costs one pass over the state
+# instead of four. Every qubit has at most one pending block; a gate either joins the
+# blocks of its qubits (if they fit in two qubits) or flushes them. Blocks on disjoint
+# qubits commute, so flushing them late keeps the circuit's result.
+
+_SWAP = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
+
+
+def _gate(op, matrix):
+    # the op's matrix, or None if it cannot be fused
+    if len(op.qubits) not in (1, 2) or op.clbits or op.name in ('measure', 'reset', 'initialize', 'barrier'):
+        return None
+    try:
+        m = np.asarray(matrix(op.name, op.params))
+    except (TypeError, ValueError, KeyError):
+        return None
+    return m if m.shape == (2**len(op.qubits),) * 2 else None
+
+
+def _widen(block, qubits):
+    # block's matrix on qubits, the first listed qubit being the most significant
+    if block['qubits'] == qubits:
+        return block['matrix']
+    if len(block['qubits']) == 2:
+        return _SWAP.dot(block['matrix']).dot(_SWAP)
+    if block['qubits'][0] == qubits[0]:
+        return np.kron(block['matrix'], np.eye(2))
+    return np.kron(np.eye(2), block['matrix'])
+
+
+class _Fuser(object):
+    def __init__(self):
+        self.pending = {}
+        self.out = []
+        self.removed = 0
+
+    def flush(self, qubits):
+        for q in qubits:
+            block = self.pending.get(q)
+            if block is None:
+                continue
+            for p in block['qubits']:
+                del self.pending[p]
+            if len(block['ops']) == 1:
+                self.out.append(block['ops'][0])
+            else:
+                self.out.append(Op('unitary', block['qubits'], (block['matrix'],), ()))
+                self.removed += len(block['ops']) - 1
+
+    def add(self, op, m):
+        blocks = []
+        for q in op.qubits:
+            block = self.pending.get(q)
+            if block is not None and all(b is not block for b in blocks):
+                blocks.append(block)
+        qubits = set(op.qubits)
+        for b in blocks:
+            qubits.update(b['qubits'])
+        if len(qubits) > 2:
+            self.flush(op.qubits)
+            blocks = []
+            qubits = set(op.qubits)
+
+        # the new block's qubit order: the widest existing block's, else the gate's
+        order = max([b['qubits'] for b in blocks] + [op.qubits], key=len)
+        if len(order) < len(qubits):
+            order = order + tuple(q for q in sorted(qubits) if q not in order)
+
+        matrix = np.eye(2**len(order), dtype=complex)
+        ops = []
+        for b in blocks:
+            matrix = _widen(b, order).dot(matrix)
+            ops.extend(b['ops'])
+        matrix = _widen({'qubits': op.qubits, 'matrix': m}, order).dot(matrix)
+        block = {'qubits': order, 'matrix': matrix, 'ops': ops + [op]}
+        for q in order:
+            self.pending[q] = block
+
+
+def fuse(ops, matrix):
+    # matrix(name, params) gives a gate's matrix; returns the fused ops and the number of
+    # passes over the state they save
+    fuser = _Fuser()
+    for op in ops:
+        m = _gate(op, matrix)
+        if m is None:
+            fuser.flush(op.qubits)
+            fuser.out.append(op)
+        else:
+            fuser.add(op, m)
+    fuser.flush(list(fuser.pending.keys()))
+    return fuser.out, fuser.removed
@@ -1,8 +1,6 @@
 import numpy as np
 
-# importing QISKit
-from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister
-from qiskit.tools import visualization
+from circuit import QuantumCircuit, ClassicalRegister, QuantumRegister
 import util
 
 # https://cstheory.stackexchange.com/questions/38538/oracle-construction-for-grovers-algorithm
@@ -43,4 +41,5 @@ def build_circuit():
 if __name__ == "__main__":
     hist = util.get_probs(build_circuit(), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
@@ -1,6 +1,4 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 
@@ -81,4 +79,5 @@ def controlled(qc, ctrl, anc, tgt, cc_gate = lambda qc, ctrl1, ctrl2, tgt: qc.cc
 if __name__ == "__main__":
     hist = util.get_probs(build_circuit(5), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
@@ -1,6 +1,4 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 
@@ -118,4 +116,5 @@ def controlled(qc, ctrl, anc, tgt, cc_gate = lambda qc, c1, c2, t: qc.ccx(c1, c2
 if __name__ == "__main__":
     hist = util.get_probs(build_circuit(15), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
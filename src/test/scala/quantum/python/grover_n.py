@@ -1,32 +1,37 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
 import math
+from circuit import QuantumCircuit, QuantumRegister
+import ir
 import util
 
 
-def build_circuit(n, m):
+# native: multi-controlled gates instead of the ancilla ladder, numpy engine only
+# compact: an ir.Circuit, gates stored in arrays and whole registers added at once
+def build_circuit(n, m, native=False, compact=False):
     q = QuantumRegister(n, "ctrl")
-    a = QuantumRegister(n - 1, "anc")
     t = QuantumRegister(1, "tgt")
+    circuit = ir.Circuit if compact else QuantumCircuit
 
-    qc = QuantumCircuit(q, a, t)
+    if native:
+        a = None
+        qc = circuit(q, t)
+    else:
+        a = QuantumRegister(n - 1, "anc")
+        qc = circuit(q, a, t)
 
     # set last bit to 1
     qc.x(t[0])
 
     # superposition
-    for i in range(0, n):
-        qc.h(q[i])
+    qc.h(q)
 
     qc.h(t[0])
 
     for i in range(0, int(math.sqrt(2**n))):
         # oracle
-        oracle(n, m, qc, q, a, t)
+        oracle(n, m, qc, q, a, t, native)
 
         # diffusion
-        diffusion(qc, q, a)
+        diffusion(qc, q, a, native)
 
     return qc, None, None
 
@@ -35,32 +40,31 @@ def is_bit_not_set(m, k):
     return not (m & (1 << k))
 
 
-def oracle(n, m, qc, q, a, t):
+def oracle(n, m, qc, q, a, t, native=False):
     for i in range(0, n):
         if is_bit_not_set(m, i):
             qc.x(q[n - 1 - i])
 
-    util.controlled_X(qc, q, a, t)
+    util.controlled_X(qc, q, a, t, native)
 
     for i in range(0, n):
         if is_bit_not_set(m, i):
             qc.x(q[n - 1 - i])
 
 
-def diffusion(qc, q, a):
-    for i in range(0, len(q)):
-        qc.h(q[i])
-        qc.x(q[i])
+def diffusion(qc, q, a, native=False):
+    qc.h(q)
+    qc.x(q)
 
     # controlled Z
-    util.controlled_Z(qc, [q[i] for i in range(0, len(q) - 1)], a, [q[len(q) - 1]])
+    util.controlled_Z(qc, [q[i] for i in range(0, len(q) - 1)], a, [q[len(q) - 1]], native)
 
-    for i in range(0, len(q)):
-        qc.x(q[i])
-        qc.h(q[i])
+    qc.x(q)
+    qc.h(q)
 
 
 if __name__ == "__main__":
     hist = util.get_probs(build_circuit(5, 31), 'sim')
     print(hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
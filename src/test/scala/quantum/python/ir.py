@@ -0,0 +1,276 @@
+import array
+import itertools
+import numbers
+from collections import OrderedDict
+
+import numpy as np
+
+import circuit
+from circuit import Instruction, Op
+
+# Circuits as typed arrays instead of one instruction object per gate: an opcode per gate,
+# and its qubits, clbits and parameters in CSR form (one flat array of values plus the end
+# offset of every gate in it). Qubits and clbits are global indices in register order, as
+# in circuit.Op. Gate names get opcodes as they are first used; parameters that are not
+# numbers (sympy expressions, matrices) are kept per gate in a dict.
+#
+# Circuit has the gate methods of circuit.QuantumCircuit; a single gate is a few appends
+# to the arrays, a whole register or a layer() of many gates is one NumPy write:
+#
+#   qc = ir.Circuit(q, t)
+#   qc.h(q)                                   # h on every qubit of q
+#   qc.layer('cx', [[0, 1], [2, 3]])          # two cx gates
+#   qc.layer('ry', qc.indices(q), [[0.1], [0.2], [0.3]])
+#
+# circuit.ops reads the arrays directly, so every local engine takes a Circuit as is;
+# from_circuit / to_circuit convert both ways without losing gates, names or blocks.
+
+
+class _Column(object):
+    # array.array of dtype values: cheap single appends, NumPy arrays appended in bulk
+    def __init__(self, typecode, dtype, initial=()):
+        self.array = array.array(typecode, initial)
+        self.dtype = np.dtype(dtype)
+
+    def extend(self, values):
+        self.array.frombytes(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+
+    def view(self):
+        # a copy, the array stays free to grow
+        return np.frombuffer(self.array, dtype=self.dtype).copy()
+
+
+def _complex(values):
+    # parameters are stored as (real, imag) pairs of doubles
+    return [complex(values[j], values[j + 1]) for j in range(0, len(values), 2)]
+
+
+class Circuit(object):
+    _ids = itertools.count()
+
+    def __init__(self, *regs, **kwargs):
+        self.regs = OrderedDict()
+        self.name = kwargs.get('name') or 'circuit' + str(next(Circuit._ids))
+        self.names = []
+        self._codes = {}
+        self._offsets = {}
+        self._n_qubits = 0
+        self._n_clbits = 0
+        self.opcodes = _Column('h', np.int16)
+        self.qubit_ptr = _Column('q', np.int64, [0])
+        self.qubits = _Column('i', np.int32)
+        self.clbit_ptr = _Column('q', np.int64, [0])
+        self.clbits = _Column('i', np.int32)
+        self.param_ptr = _Column('q', np.int64, [0])
+        self.params = _Column('d', complex)
+        # gate index -> parameters that are not numbers
+        self.objects = {}
+        self.add(*regs)
+
+    def add(self, *regs):
+        for r in regs:
+            if type(r).__name__ == 'QuantumRegister':
+                self._offsets[r.name] = self._n_qubits
+                self._n_qubits += r.size
+            else:
+                self._offsets[r.name] = self._n_clbits
+                self._n_clbits += r.size
+            self.regs[r.name] = r
+
+    def __len__(self):
+        return len(self.opcodes.array)
+
+    def _code(self, name):
+        if name not in self._codes:
+            self._codes[name] = len(self.names)
+            self.names.append(name)
+        return self._codes[name]
+
+    def index(self, bit):
+        # global index of a (register, i) bit
+        reg, i = bit
+        if not 0 <= i < reg.size:
+            raise IndexError("register index out of range: %d" % i)
+        return self._offsets[reg.name] + i
+
+    def indices(self, reg):
+        return np.arange(self._offsets[reg.name], self._offsets[reg.name] + reg.size)
+
+    def append(self, name, qubits, params=(), clbits=()):
+        # one gate over global indices
+        for q in qubits:
+            if not 0 <= q < self._n_qubits:
+                raise IndexError("qubit index out of range in " + name)
+        return self._append(name, qubits, params, clbits)
+
+    def _append(self, name, qubits, params, clbits):
+        if all(isinstance(p, numbers.Number) for p in params):
+            for p in params:
+                p = complex(p)
+                self.params.array.extend((p.real, p.imag))
+        else:
+            self.objects[len(self)] = tuple(params)
+        self.opcodes.array.append(self._code(name))
+        self.qubits.array.extend(qubits)
+        self.qubit_ptr.array.append(len(self.qubits.array))
+        self.clbits.array.extend(clbits)
+        self.clbit_ptr.array.append(len(self.clbits.array))
+        self.param_ptr.array.append(len(self.params.array) // 2)
+        return self
+
+    def layer(self, name, qubits, params=(), clbits=None):
+        # m gates of one kind: qubits (m, k) or (m,) global indices, numeric params (m, p)
+        # or one row for all of them, clbits (m, c)
+        qubits = np.asarray(qubits, dtype=np.int64)
+        qubits = qubits.reshape(len(qubits), -1) if qubits.ndim else qubits.reshape(1, 1)
+        m, k = qubits.shape
+        if m == 0:
+            return self
+        if qubits.size and (qubits.min() < 0 or qubits.max() >= self._n_qubits):
+            raise IndexError("qubit index out of range in " + name)
+        values = np.asarray(params, dtype=complex)
+        if values.ndim < 2:
+            values = values.reshape(1, -1)
+        values = np.broadcast_to(values, (m, values.shape[1]))
+        clbits = np.zeros((m, 0), dtype=np.int64) if clbits is None else np.asarray(clbits).reshape(m, -1)
+
+        self.opcodes.extend(np.full(m, self._code(name)))
+        self.qubits.extend(qubits)
+        self.qubit_ptr.extend(self.qubit_ptr.array[-1] + k * np.arange(1, m + 1))
+        self.clbits.extend(clbits)
+        self.clbit_ptr.extend(self.clbit_ptr.array[-1] + clbits.shape[1] * np.arange(1, m + 1))
+        self.params.extend(values)
+        self.param_ptr.extend(self.param_ptr.array[-1] + values.shape[1] * np.arange(1, m + 1))
+        return self
+
+    def _bits(self, arg):
+        # a single (register, i) bit is one index, a register all of its indices
+        if isinstance(arg, tuple):
+            return np.array([self.index(arg)])
+        return self.indices(arg)
+
+    def _gate(self, name, params, qubit_args, clbit_args=()):
+        args = list(qubit_args) + list(clbit_args)
+        if all(type(a) is tuple for a in args):
+            # single bits, already checked by their register
+            offsets = self._offsets
+            return self._append(name, [offsets[r.name] + i for r, i in qubit_args], params,
+                                [offsets[r.name] + i for r, i in clbit_args])
+
+        columns = [self._bits(a) for a in args]
+        sizes = set(len(c) for c in columns if len(c) > 1)
+        if len(sizes) > 1:
+            raise ValueError("registers of different sizes")
+        m = sizes.pop() if sizes else 1
+        columns = [np.broadcast_to(c, (m,)) for c in columns]
+        qubits = np.stack(columns[:len(qubit_args)], axis=1)
+        clbits = np.stack(columns[len(qubit_args):], axis=1) if clbit_args else None
+        if not all(isinstance(p, numbers.Number) for p in params):
+            for i in range(m):
+                self.append(name, qubits[i].tolist(), params, [] if clbits is None else clbits[i].tolist())
+            return self
+        return self.layer(name, qubits, list(params), clbits)
+
+    def measure(self, q, c):
+        return self._gate('measure', (), [q], [c])
+
+    def reset(self, q):
+        return self._gate('reset', (), [q])
+
+    def barrier(self, *args):
+        args = args or [r for r in self.regs.values() if type(r).__name__ == 'QuantumRegister']
+        return self.append('barrier', np.concatenate([self._bits(a) for a in args]).tolist())
+
+    def initialize(self, params, qubits):
+        qubits = [self.index(b) for b in qubits] if isinstance(qubits, list) else self._bits(qubits).tolist()
+        return self.append('initialize', qubits, list(params))
+
+    def _attach(self, instruction):
+        # instructions built elsewhere, e.g. util.mcx
+        quantum = [type(reg).__name__ == 'QuantumRegister' for reg, _ in instruction.arg]
+        self.append(instruction.name, [self.index(b) for b, q in zip(instruction.arg, quantum) if q],
+                    list(instruction.param), [self.index(b) for b, q in zip(instruction.arg, quantum) if not q])
+        return instruction
+
+    def _gate_params(self, i, name, values):
+        if i in self.objects:
+            return self.objects[i]
+        if name == 'initialize':
+            return tuple(values)
+        return tuple(v.real if not v.imag else v for v in values)
+
+    def to_ops(self):
+        # the circuit.Op list the engines run, read straight from the arrays
+        names = self.names
+        qp, qs = self.qubit_ptr.array.tolist(), self.qubits.array.tolist()
+        cp, cs = self.clbit_ptr.array.tolist(), self.clbits.array.tolist()
+        pp, ps = self.param_ptr.array.tolist(), self.params.view().tolist()
+        result = []
+        for i, code in enumerate(self.opcodes.array.tolist()):
+            name = names[code]
+            params = self._gate_params(i, name, ps[pp[i]:pp[i + 1]]) if pp[i] != pp[i + 1] or i in self.objects else ()
+            result.append(Op(name, tuple(qs[qp[i]:qp[i + 1]]), params, tuple(cs[cp[i]:cp[i + 1]])))
+        return result
+
+    @property
+    def data(self):
+        return _Data(self)
+
+
+for _name, (_n_params, _n_qubits) in circuit.GATES.items():
+    setattr(Circuit, _name, circuit._method(_name, _n_params, _n_qubits))
+
+
+class _Data(object):
+    # qc.data as circuit.Instruction objects, made on access
+    def __init__(self, qc):
+        self.qc = qc
+        bits = lambda quantum: [(r, i) for r in qc.regs.values()
+                                if (type(r).__name__ == 'QuantumRegister') == quantum for i in range(r.size)]
+        self._qubits, self._clbits = bits(True), bits(False)
+
+    def __len__(self):
+        return len(self.qc)
+
+    def _instruction(self, op):
+        return Instruction(op.name, op.params, [self._qubits[q] for q in op.qubits] +
+                           [self._clbits[c] for c in op.clbits])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("instruction index out of range")
+        qc = self.qc
+        qp, cp, pp = qc.qubit_ptr.array, qc.clbit_ptr.array, qc.param_ptr.array
+        name = qc.names[qc.opcodes.array[i]]
+        params = (qc._gate_params(i, name, _complex(qc.params.array[2 * pp[i]:2 * pp[i + 1]]))
+                  if pp[i] != pp[i + 1] or i in qc.objects else ())
+        return self._instruction(Op(name, tuple(qc.qubits.array[qp[i]:qp[i + 1]]), params,
+                                    tuple(qc.clbits.array[cp[i]:cp[i + 1]])))
+
+    def __iter__(self):
+        for op in self.qc.to_ops():
+            yield self._instruction(op)
+
+
+def from_circuit(qc):
+    # a QuantumCircuit (this directory's or QISKit's) as a Circuit over the same registers
+    regs = circuit._values(qc.regs) if hasattr(qc, 'regs') else circuit._values(qc.qregs) + circuit._values(qc.cregs)
+    out = Circuit(*regs, name=qc.name)
+    for op in circuit.ops(qc):
+        out.append(op.name, op.qubits, op.params, op.clbits)
+    if hasattr(qc, 'blocks'):
+        out.blocks = list(qc.blocks)
+    return out
+
+
+def to_circuit(qc):
+    out = circuit.QuantumCircuit(*qc.regs.values(), name=qc.name)
+    for inst in qc.data:
+        out._attach(inst)
+    if hasattr(qc, 'blocks'):
+        out.blocks = list(qc.blocks)
+    return out
@@ -0,0 +1,230 @@
+import os
+import tempfile
+
+import numpy as np
+
+import blocks
+import results
+import statevector
+from circuit import Op
+
+# Statevector engine for states larger than memory: the amplitudes live in a numpy.memmap
+# file and gates are applied a working set at a time.
+#
+# Qubits below c (the chunk qubits) index inside a contiguous run of 2^c amplitudes.
+# Consecutive gates are grouped as long as they act on at most GLOBAL_QUBITS of the high
+# qubits; one pass over the file then loads, for every value of the other high qubits,
+# the 2^|H| runs that differ in the group's high qubits H, applies the whole group in
+# memory and writes the runs back. Runs are read and written in file order. High qubits
+# a gate only reads (controls of mcx, every qubit of mcz and diagonal gates) are fixed
+# within a working set and do not count against GLOBAL_QUBITS.
+
+BACKENDS = ['local_memmap_simulator']
+
+# bytes of amplitudes held in memory at a time
+MEMORY = int(os.environ.get('MEMMAP_BYTES', 2**30))
+
+# high qubits a group of gates may act on, a working set holds 2^GLOBAL_QUBITS runs
+GLOBAL_QUBITS = 3
+
+
+def create(n, directory=None):
+    # |0...0> in a new file; the file is unlinked right away and lives as long as the map
+    fd, path = tempfile.mkstemp(suffix='.state', dir=directory or os.environ.get('MEMMAP_DIR'))
+    os.close(fd)
+    state = np.memmap(path, dtype=complex, mode='w+', shape=(2**n,))
+    state[0] = 1
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    return state
+
+
+def chunk_qubits(n, memory=MEMORY):
+    w = int(np.log2(max(memory // np.dtype(complex).itemsize, 1)))
+    return min(n, max(w - GLOBAL_QUBITS, 0))
+
+
+def active(op, c):
+    # high qubits the op changes, as opposed to only reading them
+    if op.name in ('diagonal', 'mcz', 'barrier'):
+        return set()
+    if op.name == 'mcx':
+        return set([op.qubits[-1]]) if op.qubits[-1] >= c else set()
+    return set(q for q in op.qubits if q >= c)
+
+
+def groups(ops, c):
+    # consecutive ops sharing one working set, with the high qubits they act on
+    result = []
+    for op in ops:
+        changed = active(op, c)
+        if len(changed) > GLOBAL_QUBITS:
+            raise ValueError("gate acts on too many high qubits for the memmap engine: " + op.name)
+        if result and len(result[-1][1] | changed) <= GLOBAL_QUBITS:
+            result[-1][0].append(op)
+            result[-1][1].update(changed)
+        else:
+            result.append(([op], set(changed)))
+    return [(group, sorted(high)) for group, high in result]
+
+
+def specialize(op, base, c, high):
+    # op inside the working set at base: fixed high qubits are replaced by their bit value,
+    # the rest is renumbered to the working set's qubits
+    local = dict((q, q) for q in range(c))
+    local.update((q, c + j) for j, q in enumerate(high))
+    fixed = [q for q in op.qubits if q not in local]
+    bit = lambda q: (base >> q) & 1
+    keep = tuple(local[q] for q in op.qubits if q in local)
+
+    if op.name == 'barrier':
+        return []
+    if op.name == 'diagonal':
+        index = np.arange(2**len(op.qubits))
+        select = np.ones(len(index), dtype=bool)
+        for j, q in enumerate(op.qubits):
+            if q in fixed:
+                select &= ((index >> j) & 1) == bit(q)
+        return [Op('diagonal', keep, (op.params[0][select],), ())]
+    if op.name in ('mcx', 'mcz'):
+        if any(not bit(q) for q in fixed):
+            return []
+        if not keep:
+            return [Op('diagonal', (), (np.array([-1]),), ())]
+        return [Op(op.name, keep, (), ())]
+    return [Op(op.name, keep, op.params, op.clbits)]
+
+
+def _passes(n, c, high):
+    # (base, run offsets) of every working set, in file order
+    others = [q for q in range(c, n) if q not in high]
+    runs = results.deposit(np.arange(2**len(high)), high)
+    for r in range(2**len(others)):
+        base = int(results.deposit(r, others))
+        yield base, base + runs
+
+
+def apply(state, ops, n, c, high):
+    size = 2**c
+    block = np.empty(size << len(high), dtype=state.dtype)
+    for base, offsets in _passes(n, c, high):
+        for j, offset in enumerate(offsets):
+            block[j*size:(j + 1)*size] = state[offset:offset + size]
+        local = block.reshape((2,) * (c + len(high)))
+        for op in ops:
+            for specialized in specialize(op, base, c, high):
+                local = statevector.step(local, specialized, threads=None)
+        block = local.reshape(-1)
+        for j, offset in enumerate(offsets):
+            state[offset:offset + size] = block[j*size:(j + 1)*size]
+    state.flush()
+    return state
+
+
+def simulate(ops, n, memory=MEMORY, directory=None):
+    state = create(n, directory)
+    c = chunk_qubits(n, memory)
+    # a QFT block over more high qubits than a working set holds runs gate by gate
+    ops = blocks.expand(ops, lambda op: len(active(op, c)) <= GLOBAL_QUBITS)
+    for group, high in groups(ops, c):
+        apply(state, group, n, c, high)
+    return state
+
+
+def _chunks(state, memory=MEMORY):
+    size = max(memory // state.dtype.itemsize, 1)
+    for start in range(0, len(state), size):
+        yield start, np.asarray(state[start:start + size])
+
+
+def sample(state, measures, shots, rng, memory=MEMORY):
+    # shots are split over the chunks by their total probability, then drawn inside each
+    weights = np.array([np.sum(np.abs(chunk)**2) for _, chunk in _chunks(state, memory)])
+    per_chunk = rng.multinomial(shots, weights / weights.sum())
+    outcomes, drawn = [], []
+    for (start, chunk), k in zip(_chunks(state, memory), per_chunk):
+        if k:
+            p = np.abs(chunk)**2
+            support = np.flatnonzero(p)
+            o, d = statevector.draw(support + start, p[support], measures, k, rng)
+            outcomes.append(o)
+            drawn.append(d)
+    if not outcomes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(outcomes), np.concatenate(drawn)
+
+
+class Result(object):
+    # state is the memmap over the given qubits of an n_qubits register, the rest are |0>;
+    # every query reads it a chunk at a time
+    def __init__(self, state, counts=None, qubits=None, n_qubits=None, memory=MEMORY):
+        self.state = state
+        self.counts = counts
+        self.qubits = qubits
+        self.n = int(np.log2(len(state)))
+        self.n_qubits = self.n if n_qubits is None else n_qubits
+        self.memory = memory
+
+    def _collect(self, select):
+        indices, values = [], []
+        for start, chunk in _chunks(self.state, self.memory):
+            i, v = select(chunk)
+            indices.append(i + start)
+            values.append(v)
+        return np.concatenate(indices), np.concatenate(values)
+
+    def _histogram(self, indices, values):
+        keys, n = results.basis_keys(indices, self.n, True, self.qubits, self.n_qubits)
+        return results.Histogram(keys, values, n)
+
+    def get_statevector(self, qc=None):
+        if self.qubits is None or len(self.qubits) == self.n_qubits:
+            return self.state
+        indices, values = self._collect(lambda a: (np.flatnonzero(a), a[np.flatnonzero(a)]))
+        full = np.zeros(2**self.n_qubits, dtype=self.state.dtype)
+        full[results.deposit(indices, self.qubits)] = values
+        return full
+
+    def probabilities(self, decimals=5):
+        def select(chunk):
+            p = np.round(np.abs(np.round(chunk, decimals))**2, decimals)
+            i = np.flatnonzero(p > 0)
+            return i, p[i]
+        return self._histogram(*self._collect(select))
+
+    def amplitudes(self, decimals=5):
+        def select(chunk):
+            a = np.round(chunk, decimals)
+            i = np.flatnonzero(a)
+            return i, a[i]
+        return self._histogram(*self._collect(select))
+
+    def support(self, tol=results.TOL):
+        def select(chunk):
+            i = np.flatnonzero(np.abs(chunk) > tol)
+            return i, chunk[i]
+        indices, values = self._collect(select)
+        return results.support(indices, values, self.n, tol, self.qubits, self.n_qubits)
+
+    def support_size(self, tol=results.TOL):
+        return int(sum(np.count_nonzero(np.abs(chunk) > tol) for _, chunk in _chunks(self.state, self.memory)))
+
+    def get_counts(self, qc=None):
+        return self.counts
+
+    def get_data(self, qc=None):
+        data = {'statevector': self.get_statevector(qc)}
+        if self.counts is not None:
+            data['counts'] = self.counts
+        return data
+
+
+def run(qc, shots=1, seed=None, reduce_ancillas=True, memory=MEMORY, directory=None):
+    # fusion matters most here: fewer, denser gates mean fewer passes over the file
+    program = statevector.compile(qc, reduce_ancillas, amplify=False)
+    state = simulate(statevector.unitary_part(program, 'memmap'), program.n, memory, directory)
+    counts = statevector.sampled_counts(program, state, shots, seed,
+                                        lambda *args: sample(*args, memory=memory))
+    return Result(state, counts, program.qubits, program.n_qubits, memory)
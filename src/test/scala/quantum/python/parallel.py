@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Gate kernels split over index ranges and run on a thread pool. NumPy releases the GIL
+# inside its loops, so the chunks of one gate run on separate cores. A chunk fixes the
+# highest qubits the gate does not touch, which makes it a contiguous slab (or a few) of
+# the state, sized to stay in L2 while the gate runs over it.
+
+THREADS = int(os.environ.get('QUANTUM_THREADS', os.cpu_count() or 1))
+
+
+def _l2_bytes():
+    try:
+        with open('/sys/devices/system/cpu/cpu0/cache/index2/size') as f:
+            size = f.read().strip()
+    except (IOError, OSError):
+        return 2**20
+    scale = {'K': 2**10, 'M': 2**20, 'G': 2**30}
+    if size[-1:].upper() in scale:
+        return int(size[:-1]) * scale[size[-1:].upper()]
+    return int(size)
+
+
+# amplitudes per chunk, a power of two
+CHUNK = 2**int(np.log2(max(_l2_bytes() // np.dtype(complex).itemsize, 1)))
+
+# states below this many amplitudes are not worth splitting
+MIN_SIZE = 4 * CHUNK
+
+_pools = {}
+
+
+def _pool(threads):
+    if threads not in _pools:
+        _pools[threads] = ThreadPoolExecutor(max_workers=threads)
+    return _pools[threads]
+
+
+def run(kernel, state, qubits, threads=None, in_place=False):
+    # kernel(state, qubits) on every chunk; in place kernels write into the chunk views,
+    # the others return new chunks that are gathered into a new state
+    if threads is None:
+        threads = THREADS
+    if threads <= 1 or state.size < MIN_SIZE:
+        return kernel(state, qubits)
+
+    ndim = state.ndim
+    gate_axes = set(ndim - 1 - q for q in qubits)
+    split = [a for a in range(ndim) if a not in gate_axes][:int(np.log2(state.size // CHUNK))]
+    if not split:
+        return kernel(state, qubits)
+
+    # a chunk drops the split axes, the remaining qubits are renumbered
+    axes = [a for a in range(ndim) if a not in split]
+    local = [len(axes) - 1 - axes.index(ndim - 1 - q) for q in qubits]
+
+    out = state if in_place else np.empty_like(state)
+
+    def chunk(i):
+        index = [slice(None)] * ndim
+        for k, a in enumerate(split):
+            index[a] = (i >> k) & 1
+        index = tuple(index)
+        result = kernel(state[index], local)
+        if not in_place:
+            out[index] = result
+
+    list(_pool(threads).map(chunk, range(2**len(split))))
+    return out
@@ -1,10 +1,7 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 import math
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 def build_circuit(x):
@@ -38,6 +35,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
 
     print("probability of 0 = ", math.pow(np.cos(np.pi*(x/2)), 2))
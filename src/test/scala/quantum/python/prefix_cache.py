@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import circuit
+
+# Intermediate states of related circuits, keyed by a rolling hash of the gate sequence.
+#
+# Gates are first put in a canonical order (gates on disjoint qubits commute, so the
+# ready gate with the lowest highest qubit goes first). That lines up circuits that only
+# differ in width or in a suffix, like fib.build_circuit(i) and (i+1): the Hadamard layer
+# and cry chain of the smaller one become a prefix of the larger one. A state is stored
+# only over the qubits its prefix touched, the rest are |0>, so it can resume a wider
+# circuit too.
+
+DEFAULT_BUDGET = int(os.environ.get('PREFIX_CACHE_BYTES', 256 * 2**20))
+
+
+class PrefixCache(object):
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def put(self, key, state):
+        if state.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._states:
+                self._states.move_to_end(key)
+                return
+            self._states[key] = state
+            self.nbytes += state.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._states.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._states)
+
+
+def prefix_keys(ops, dtype=complex):
+    # keys[i] identifies ops[:i] run in the given amplitude type
+    h = hashlib.blake2b(np.dtype(dtype).str.encode(), digest_size=16)
+    keys = [h.digest()]
+    for op in ops:
+        h = hashlib.blake2b(keys[-1], digest_size=16)
+        # fused matrices go in as raw bytes, their shape and dtype in the repr
+        h.update(repr((op.name, op.qubits, [(p.dtype.str, p.shape) if isinstance(p, np.ndarray)
+                                            else circuit.param_repr(p) for p in op.params])).encode())
+        for p in op.params:
+            if isinstance(p, np.ndarray):
+                h.update(np.ascontiguousarray(p).tobytes())
+        keys.append(h.digest())
+    return keys
+
+
+def _widen(state, n):
+    # stored states cover the low qubits only, the missing high qubits are |0>
+    full = np.zeros(2**n, dtype=state.dtype)
+    full[:state.size] = state.reshape(-1)
+    return full.reshape((2,) * n)
+
+
+def _narrow(state, width):
+    return state.reshape(-1)[:2**width].copy()
+
+
+def simulate(ops, n, cache, step, dtype=complex):
+    # step(state, op) applies one gate; only unitary ops may be passed in
+    ops = circuit.canonical(ops)
+    keys = prefix_keys(ops, dtype)
+
+    start = 0
+    state = None
+    for i in range(len(ops), 0, -1):
+        cached = cache.get(keys[i])
+        if cached is not None and cached.size <= 2**n:
+            start, state = i, _widen(cached, n)
+            break
+    if state is None:
+        cache.misses += 1
+        state = _widen(np.ones(1, dtype=dtype), n)
+    else:
+        cache.hits += 1
+
+    width = max([q for op in ops[:start] for q in op.qubits] + [-1]) + 1
+    for i in range(start, len(ops)):
+        top = max(ops[i].qubits) + 1 if ops[i].qubits else 0
+        if top > width:
+            # the next gate widens the prefix, remember where we are
+            if i > start:
+                cache.put(keys[i], _narrow(state, width))
+            width = top
+        state = step(state, ops[i])
+
+    if len(ops) > start:
+        cache.put(keys[len(ops)], _narrow(state, width))
+    return state
@@ -0,0 +1,170 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+# Opt-in profiling of the numpy engine. Inside profile(), every gate the engine applies
+# is timed and counted per (gate name, number of qubits) together with the bytes of state
+# it reads and writes, and the stages (build, transpile, simulate, histogram) are timed
+# around them:
+#
+#   with profiler.profile() as p:
+#       with p.stage('build'):
+#           c = grover_n.build_circuit(8, 255)
+#       util.get_probs(c, 'np', 'local_numpy_simulator')
+#   print(p.summary())
+#   p.save_trace('grover.json')     # chrome://tracing or https://ui.perfetto.dev
+#
+# Gates are recorded as the engine runs them: after ancilla reduction a ccx ladder is one
+# mcx, and fusion turns runs of gates into 'unitary' / 'diagonal'; statevector.run with
+# reduce_ancillas=False, amplify=False, fuse=False attributes time to the gates as built.
+# Outside profile() the engine only checks ACTIVE once per gate and stage.
+
+# the profile gates and stages are recorded into, None when profiling is off
+ACTIVE = None
+
+# trace events kept per profile, the aggregates keep counting past it
+MAX_EVENTS = 10**6
+
+
+def touched(state, op):
+    # bytes of amplitudes a gate reads plus the bytes it writes
+    if op.name == 'barrier':
+        return 0
+    if op.name == 'mcx':
+        # swaps the two halves where all controls are set
+        return 2 * state.nbytes >> (len(op.qubits) - 1)
+    if op.name == 'mcz':
+        # negates the amplitudes where every qubit is set
+        return 2 * state.nbytes >> len(op.qubits)
+    return 2 * state.nbytes
+
+
+class Profile(object):
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # (gate name, qubit count) -> [calls, seconds, bytes]
+        self.gates = {}
+        # stage -> [calls, seconds]
+        self.stages = OrderedDict()
+        # (name, category, start, seconds, args) in start order
+        self.events = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def _event(self, name, category, start, elapsed, args=None):
+        if len(self.events) < MAX_EVENTS:
+            self.events.append((name, category, start, elapsed, args))
+        else:
+            self.dropped += 1
+
+    def gate(self, kernel, state, op, *args):
+        start = self.clock()
+        out = kernel(state, op, *args)
+        elapsed = self.clock() - start
+        size = touched(state, op)
+        with self._lock:
+            entry = self.gates.setdefault((op.name, len(op.qubits)), [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += size
+            self._event(op.name, 'gate', start, elapsed, {'qubits': list(op.qubits), 'bytes': size})
+        return out
+
+    @contextmanager
+    def stage(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            with self._lock:
+                entry = self.stages.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+                self._event(name, 'stage', start, elapsed)
+
+    def summary(self):
+        total = sum(seconds for _, seconds, _ in self.gates.values())
+        lines = ["%-12s %6s %10s %12s %7s %14s" % ('gate', 'qubits', 'calls', 'seconds', '%', 'MB touched')]
+        for (name, k), (calls, seconds, size) in sorted(self.gates.items(), key=lambda g: -g[1][1]):
+            lines.append("%-12s %6d %10d %12.6f %6.1f%% %14.1f" % (
+                name, k, calls, seconds, 100.0 * seconds / total if total else 0.0, size / 2.0**20))
+        lines.append("")
+        lines.append("%-12s %6s %10s %12s" % ('stage', '', 'calls', 'seconds'))
+        for name, (calls, seconds) in self.stages.items():
+            lines.append("%-12s %6s %10d %12.6f" % (name, '', calls, seconds))
+        if self.dropped:
+            lines.append("(%d trace events over MAX_EVENTS were not kept)" % self.dropped)
+        return "\n".join(lines)
+
+    def trace(self):
+        # Chrome trace event format, complete events in microseconds
+        pid = os.getpid()
+        events = []
+        for name, category, start, elapsed, args in self.events:
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': 0 if category == 'stage' else 1,
+                     'ts': start * 1e6, 'dur': elapsed * 1e6}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f)
+
+
+@contextmanager
+def profile(clock=time.perf_counter):
+    global ACTIVE
+    previous = ACTIVE
+    ACTIVE = Profile(clock)
+    try:
+        yield ACTIVE
+    finally:
+        ACTIVE = previous
+
+
+@contextmanager
+def stage(name):
+    if ACTIVE is None:
+        yield
+    else:
+        with ACTIVE.stage(name):
+            yield
+
+
+def timed(name):
+    # decorator: calls of the function are recorded as the given stage
+    def decorate(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if ACTIVE is None:
+                return f(*args, **kwargs)
+            with ACTIVE.stage(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+if __name__ == "__main__":
+    # the engine records into the imported module, not into __main__
+    import grover_n
+    import profiler
+    import statevector
+
+    # python profiler.py [n] [trace.json]: grover_n gate by gate, as built
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    with profiler.profile() as p:
+        with p.stage('build'):
+            qc, _, _ = grover_n.build_circuit(n, 2**n - 1)
+        result = statevector.run(qc, reduce_ancillas=False, amplify=False, fuse=False, cache=None)
+        result.probabilities(5)
+    print(p.summary())
+    if len(sys.argv) > 2:
+        p.save_trace(sys.argv[2])
@@ -0,0 +1,86 @@
+import copy
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+
+import circuit
+import profiler
+
+# compiled qobjs on disk, keyed by circuit structure, backend, its basis gates and coupling
+# map, seed and the qiskit version that compiled them
+CACHE_DIR = os.environ.get('QOBJ_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'quantum-scala', 'qobj'))
+
+# compiled qobjs kept in this process, the least recently used is dropped first
+MEMORY_ENTRIES = 256
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def cache_key(qc, backend, coupling_map, seed, basis_gates=None):
+    import qiskit
+    h = hashlib.sha256()
+    h.update(circuit.fingerprint(qc).encode())
+    h.update(repr((backend, basis_gates, coupling_map, seed, getattr(qiskit, '__version__', None))).encode())
+    return h.hexdigest()
+
+
+def _recall(key):
+    with _lock:
+        qobj = _memory.get(key)
+        if qobj is not None:
+            _memory.move_to_end(key)
+        return qobj
+
+
+def _remember(key, qobj):
+    with _lock:
+        _memory[key] = qobj
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _load(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _store(path, qobj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.' + uuid.uuid4().hex + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(qobj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+@profiler.timed('transpile')
+def compile(qc, backend, coupling_map, seed=0, shots=1024, cache_dir=None, basis_gates=None):
+    # basis_gates: the backend's, as in its configuration; None lets qiskit look them up
+    key = cache_key(qc, backend, coupling_map, seed, basis_gates)
+    path = os.path.join(cache_dir or CACHE_DIR, key[:2], key + '.pkl')
+
+    qobj = _recall(key)
+    if qobj is None:
+        qobj = _load(path)
+    if qobj is None:
+        from qiskit import compile as qiskit_compile
+        qobj = qiskit_compile([qc], backend=backend, basis_gates=basis_gates, coupling_map=coupling_map,
+                              seed=seed, shots=shots)
+        _store(path, qobj)
+    _remember(key, qobj)
+
+    # the routed circuit is shared, only the job specific fields are refreshed
+    qobj = copy.copy(qobj)
+    qobj['id'] = uuid.uuid4().hex
+    qobj['config'] = dict(qobj['config'], shots=shots)
+    compiled = dict(qobj['circuits'][0], name=qc.name)
+    qobj['circuits'] = [compiled]
+    return qobj
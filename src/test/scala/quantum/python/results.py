@@ -0,0 +1,153 @@
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import numpy as np
+
+# amplitudes at or below this are taken to be zero by support queries
+TOL = 1e-10
+
+
+def bit_reverse(indices, n):
+    indices = np.asarray(indices, dtype=np.int64)
+    reversed_indices = np.zeros_like(indices)
+    for k in range(n):
+        reversed_indices |= ((indices >> k) & 1) << (n - 1 - k)
+    return reversed_indices
+
+
+def deposit(indices, positions):
+    # spreads the bits of indices over the given bit positions of a wider index
+    indices = np.asarray(indices, dtype=np.int64)
+    wide = np.zeros_like(indices)
+    for k, p in enumerate(positions):
+        wide |= ((indices >> k) & 1) << p
+    return wide
+
+
+def format_keys(indices, n, sizes=None):
+    # vectorized bit strings, most significant bit first, optionally split into registers
+    indices = np.asarray(indices, dtype=np.int64)
+    if n == 0:
+        return [''] * len(indices)
+    bits = (indices[:, None] >> np.arange(n - 1, -1, -1)) & 1
+    chars = (bits + ord('0')).astype(np.uint8)
+    if sizes is not None and len(sizes) > 1:
+        columns = []
+        end = n
+        for size in sizes:
+            columns.insert(0, chars[:, end - size:end])
+            end -= size
+        space = np.full((len(indices), 1), ord(' '), dtype=np.uint8)
+        chars = np.hstack([c for column in columns for c in (column, space)][:-1])
+    return [s.decode() for s in np.ascontiguousarray(chars).view('S%d' % chars.shape[1]).ravel()]
+
+
+class Histogram(Mapping):
+    # outcomes as sorted integer indices with a value array; an index written in binary,
+    # most significant bit first, is the outcome's string key. The array is self.array so
+    # that values() stays the Mapping method
+    def __init__(self, indices, values, n_bits, sizes=None):
+        indices = np.asarray(indices, dtype=np.int64)
+        order = np.argsort(indices, kind='stable')
+        self.indices = indices[order]
+        self.array = np.asarray(values)[order]
+        self.n_bits = n_bits
+        self.sizes = sizes
+        self._keys = None
+
+    def _select(self, mask_or_index):
+        return Histogram(self.indices[mask_or_index], self.array[mask_or_index], self.n_bits, self.sizes)
+
+    def threshold(self, value):
+        return self._select(self.array > value)
+
+    def top(self, k):
+        if k >= len(self.array):
+            return self
+        return self._select(np.argpartition(-self.array, k - 1)[:k])
+
+    def keys_list(self):
+        if self._keys is None:
+            self._keys = format_keys(self.indices, self.n_bits, self.sizes)
+        return self._keys
+
+    def index(self, key):
+        # the key's outcome index; keys of another width or not in binary are not in here
+        bits = key.replace(' ', '') if isinstance(key, str) else None
+        if bits is None or len(bits) != self.n_bits or bits.strip('01'):
+            raise KeyError(key)
+        return int(bits, 2) if bits else 0
+
+    def __getitem__(self, key):
+        i = self.index(key)
+        pos = np.searchsorted(self.indices, i)
+        if pos == len(self.indices) or self.indices[pos] != i:
+            raise KeyError(key)
+        return self.array[pos].item()
+
+    def __iter__(self):
+        return iter(self.keys_list())
+
+    def __len__(self):
+        return len(self.indices)
+
+    def to_dict(self):
+        return dict(zip(self.keys_list(), self.array.tolist()))
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def basis_keys(support, n, reverse=True, qubits=None, n_qubits=None):
+    # qubits: positions of the state's qubits in a wider register of n_qubits, the rest are |0>
+    if qubits is not None:
+        support = deposit(support, qubits)
+        n = n_qubits
+    return (bit_reverse(support, n) if reverse else support), n
+
+
+def probabilities(state, decimals=5, reverse=True, qubits=None, n_qubits=None):
+    # QISKit statevectors are little endian, keys read qubit 0 first unless reverse is off
+    state = np.asarray(state).reshape(-1)
+    n = int(np.log2(len(state)))
+    probs = np.round(np.abs(state)**2, decimals)
+    support = np.flatnonzero(probs > 0)
+    keys, n = basis_keys(support, n, reverse, qubits, n_qubits)
+    return Histogram(keys, probs[support], n)
+
+
+def amplitudes(state, reverse=True, qubits=None, n_qubits=None):
+    state = np.asarray(state).reshape(-1)
+    n = int(np.log2(len(state)))
+    support = np.flatnonzero(state)
+    keys, n = basis_keys(support, n, reverse, qubits, n_qubits)
+    return Histogram(keys, state[support], n)
+
+
+def support(indices, amplitudes, n, tol=TOL, qubits=None, n_qubits=None):
+    # exact probabilities of the basis states whose amplitude exceeds tol, nothing is sampled
+    amplitudes = np.asarray(amplitudes)
+    keep = np.abs(amplitudes) > tol
+    keys, n = basis_keys(np.asarray(indices, dtype=np.int64)[keep], n, True, qubits, n_qubits)
+    return Histogram(keys, np.abs(amplitudes[keep])**2, n)
+
+
+def counts(outcomes, n_bits, sizes=None, weights=None):
+    # outcomes: one integer per shot (or per weight), clbit k is bit k
+    if weights is None:
+        indices, values = np.unique(np.asarray(outcomes, dtype=np.int64), return_counts=True)
+    else:
+        indices, inverse = np.unique(np.asarray(outcomes, dtype=np.int64), return_inverse=True)
+        values = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(indices)).astype(np.int64)
+    return Histogram(indices, values, n_bits, sizes)
+
+
+def from_counts(counts_dict):
+    keys = list(counts_dict.keys())
+    if not keys:
+        return Histogram([], np.array([], dtype=np.int64), 0)
+    sizes = [len(part) for part in reversed(keys[0].split(' '))]
+    indices = [int(k.replace(' ', ''), 2) for k in keys]
+    return Histogram(indices, np.array([counts_dict[k] for k in keys]), sum(sizes), sizes)
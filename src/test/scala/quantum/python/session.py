@@ -0,0 +1,82 @@
+import threading
+import time
+
+import Qconfig
+
+# A connection to the backends of one Qconfig.cfg entry: registers on first use and keeps
+# backend configurations (and with them the coupling maps) for ttl seconds. qiskit is
+# only imported once a backend is actually needed. A session is
+# safe to share between threads; nothing is kept at module level, so threads that want
+# their own session simply create one.
+
+# seconds a backend configuration is reused
+TTL = 600.0
+
+
+class Session(object):
+    def __init__(self, cfg, ttl=TTL, clock=time.monotonic):
+        # cfg: a Qconfig.cfg key or an entry of the same shape
+        self.cfg = Qconfig.cfg[cfg] if isinstance(cfg, str) else cfg
+        self.ttl = ttl
+        self.clock = clock
+        self._registered = False
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _register(self):
+        with self._lock:
+            if not self._registered:
+                if 'url' in self.cfg.keys():
+                    from qiskit import register, available_backends
+                    register(self.cfg['token'], self.cfg['url'], self.cfg['hub'], self.cfg['group'], self.cfg['project'])
+                    print(available_backends())
+                self._registered = True
+
+    def _cached(self, key, fetch):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > self.clock():
+                return entry[1]
+        # fetched outside the lock, other threads keep reading the cache meanwhile
+        value = fetch()
+        with self._lock:
+            self._cache[key] = (self.clock() + self.ttl, value)
+        return value
+
+    def backend_name(self, backend=None):
+        return backend or self.cfg['backend']
+
+    def backends(self):
+        from qiskit import available_backends
+        self._register()
+        return self._cached('backends', available_backends)
+
+    def backend(self, backend=None):
+        from qiskit import get_backend
+        self._register()
+        return get_backend(self.backend_name(backend))
+
+    def configuration(self, backend=None):
+        name = self.backend_name(backend)
+        return self._cached(('configuration', name), lambda: self.backend(name).configuration)
+
+    def coupling_map(self, backend=None):
+        return self.configuration(backend)['coupling_map']
+
+    def basis_gates(self, backend=None):
+        return self.configuration(backend).get('basis_gates')
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def session_for(cfg, session=None):
+    # session if it was made for cfg, a new Session otherwise; a session for another
+    # entry would submit with that entry's credentials and backend
+    if session is None:
+        return Session(cfg)
+    entry = Qconfig.cfg[cfg] if isinstance(cfg, str) else cfg
+    if session.cfg != entry:
+        raise ValueError("the session was made for another Qconfig entry than cfg")
+    return session
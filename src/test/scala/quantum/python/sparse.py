@@ -0,0 +1,202 @@
+import numpy as np
+
+import blocks
+import circuit
+import results
+import statevector
+import trajectories
+
+# Engine for states with few nonzero amplitudes: a state is a pair of arrays, basis
+# indices (little endian, qubit k is bit k) and their amplitudes, so memory and time
+# grow with the support instead of with 2^n. Gates are run in circuit.canonical order,
+# which keeps h layers from spreading over every qubit before entangling gates shrink
+# the support again (fib.build_circuit stays at O(F(n)) entries).
+
+BACKENDS = ['local_sparse_simulator']
+
+# amplitudes at or below this after a gate are exact cancellations and are dropped
+ATOL = 1e-12
+
+
+def zero_state():
+    return np.zeros(1, dtype=np.int64), np.ones(1, dtype=complex)
+
+
+def _gather(state, qubits):
+    # groups the entries by their bits outside qubits; bit j of a group's column is qubits[j]
+    idx, amp = state
+    mask = sum(1 << q for q in qubits)
+    bases, group = np.unique(idx & ~mask, return_inverse=True)
+    local = np.zeros_like(idx)
+    for j, q in enumerate(qubits):
+        local |= ((idx >> q) & 1) << j
+    block = np.zeros((len(bases), 2**len(qubits)), dtype=complex)
+    block[group.reshape(-1), local] = amp
+    return bases, block
+
+
+def _scatter(bases, block, qubits):
+    idx = (bases[:, None] | results.deposit(np.arange(block.shape[1]), qubits)[None, :]).reshape(-1)
+    amp = block.reshape(-1)
+    keep = np.abs(amp) > ATOL
+    return idx[keep], amp[keep]
+
+
+def apply(state, m, qubits):
+    # the first listed qubit is the most significant bit of the gate matrix
+    qubits = list(reversed(qubits))
+    bases, block = _gather(state, qubits)
+    return _scatter(bases, block.dot(np.asarray(m).T), qubits)
+
+
+def mcx(state, qubits):
+    idx, amp = state
+    controls = sum(1 << q for q in qubits[:-1])
+    flip = ((idx & controls) == controls).astype(np.int64) << qubits[-1]
+    return idx ^ flip, amp
+
+
+def mcz(state, qubits):
+    idx, amp = state
+    mask = sum(1 << q for q in qubits)
+    return idx, np.where((idx & mask) == mask, -amp, amp)
+
+
+def multiply(state, phases, qubits):
+    # phases is indexed little endian over qubits, as diagonal.accumulate builds them
+    idx, amp = state
+    index = np.zeros_like(idx)
+    for j, q in enumerate(qubits):
+        index |= ((idx >> q) & 1) << j
+    return idx, amp * phases[index]
+
+
+def _block(kernel):
+    def run(state, qubits):
+        bases, block = _gather(state, qubits)
+        m = len(qubits)
+        out = kernel(block.reshape((len(bases),) + (2,) * m), list(range(m)))
+        return _scatter(bases, out.reshape(len(bases), 2**m), qubits)
+    return run
+
+
+NATIVE = {
+    'mcx': mcx,
+    'mcz': mcz,
+    'qft': _block(blocks.qft),
+    'iqft': _block(blocks.iqft)
+}
+
+
+def probability_one(state, qubit):
+    idx, amp = state
+    return np.sum(np.abs(amp[(idx >> qubit) & 1 == 1])**2)
+
+
+def collapse(state, qubit, bit):
+    idx, amp = state
+    keep = (idx >> qubit) & 1 == bit
+    return idx[keep], amp[keep] / np.linalg.norm(amp[keep])
+
+
+def initialize(state, amplitudes, qubits):
+    bases, block = _gather(state, qubits)
+    if not np.isclose(np.linalg.norm(block[:, 0]), 1):
+        raise ValueError("initialize is only supported on qubits in state |0>")
+    amplitudes = np.asarray([complex(a) for a in amplitudes])
+    return _scatter(bases, np.multiply.outer(block[:, 0], amplitudes), qubits)
+
+
+def step(state, op, rng=None, clbits=None):
+    if op.name == 'barrier':
+        return state
+    elif op.name == 'measure':
+        bit = int(rng.random() < probability_one(state, op.qubits[0]))
+        clbits[op.clbits[0]] = bit
+        return collapse(state, op.qubits[0], bit)
+    elif op.name == 'reset':
+        if rng.random() < probability_one(state, op.qubits[0]):
+            idx, amp = collapse(state, op.qubits[0], 1)
+            return idx ^ (1 << op.qubits[0]), amp
+        return collapse(state, op.qubits[0], 0)
+    elif op.name == 'initialize':
+        return initialize(state, op.params, op.qubits)
+    elif op.name == 'diagonal':
+        return multiply(state, op.params[0], op.qubits)
+    elif op.name in NATIVE:
+        return NATIVE[op.name](state, op.qubits)
+    return apply(state, statevector.matrix(op.name, op.params), op.qubits)
+
+
+def simulate(ops, n, rng=None, clbits=None, state=None):
+    if state is None:
+        state = zero_state()
+    for op in ops:
+        state = step(state, op, rng, clbits)
+    return state
+
+
+class Result(object):
+    # indices are over the given qubits of an n_qubits register, all other qubits are |0>
+    def __init__(self, state, n, counts=None, qubits=None, n_qubits=None):
+        self.indices, self.values = (None, None) if state is None else state
+        self.n = n
+        self.counts = counts
+        self.qubits = qubits
+        self.n_qubits = n if n_qubits is None else n_qubits
+
+    def _positions(self):
+        return self.indices if self.qubits is None else results.deposit(self.indices, self.qubits)
+
+    def get_statevector(self, qc=None):
+        full = np.zeros(2**self.n_qubits, dtype=complex)
+        full[self._positions()] = self.values
+        return full
+
+    def probabilities(self, decimals=5):
+        probs = np.round(np.abs(np.round(self.values, decimals))**2, decimals)
+        keep = probs > 0
+        keys, n = results.basis_keys(self.indices[keep], self.n, True, self.qubits, self.n_qubits)
+        return results.Histogram(keys, probs[keep], n)
+
+    def amplitudes(self, decimals=5):
+        amp = np.round(self.values, decimals)
+        keep = amp != 0
+        keys, n = results.basis_keys(self.indices[keep], self.n, True, self.qubits, self.n_qubits)
+        return results.Histogram(keys, amp[keep], n)
+
+    def support(self, tol=results.TOL):
+        return results.support(self.indices, self.values, self.n, tol, self.qubits, self.n_qubits)
+
+    def support_size(self, tol=results.TOL):
+        return int(np.count_nonzero(np.abs(self.values) > tol))
+
+    def get_counts(self, qc=None):
+        return self.counts
+
+    def get_data(self, qc=None):
+        data = {}
+        if self.indices is not None:
+            data['statevector'] = self.get_statevector(qc)
+        if self.counts is not None:
+            data['counts'] = self.counts
+        return data
+
+
+def _draw(state, measures, shots, rng):
+    idx, amp = state
+    return statevector.draw(idx, np.abs(amp)**2, measures, shots, rng)
+
+
+def run(qc, shots=1, seed=None, reduce_ancillas=True, workers=None):
+    # the Grover closed form is a dense result, the sparse engine simulates every gate
+    program = statevector.compile(qc, reduce_ancillas, amplify=False)
+    ops, n, qubits, n_qubits, n_clbits, sizes, measures, _, _ = program
+    ops = circuit.canonical(ops)
+
+    if measures is None:
+        outcomes, drawn = trajectories.run(simulate, ops, n, n_clbits, shots, seed, workers)
+        return Result(None, n, results.counts(outcomes, n_clbits, sizes, drawn), qubits, n_qubits)
+
+    state = simulate([op for op in ops if op.name != 'measure'], n)
+    return Result(state, n, statevector.sampled_counts(program, state, shots, seed, _draw), qubits, n_qubits)
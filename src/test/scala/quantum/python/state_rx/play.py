@@ -1,13 +1,10 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 import math
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 # change signs of angles in rx
@@ -36,6 +33,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
 
     print("cos^2(theta)", np.round(math.pow(np.cos(theta), 2), 5))
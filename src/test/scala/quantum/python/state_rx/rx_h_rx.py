@@ -1,13 +1,10 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 import math
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 # prepare state: sqrt(1/2) * cos(theta) * |0> + sqrt(1/2) * (1 + i*sin(theta)) *  |1>
@@ -34,6 +31,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
 
     print("sqrt(1/2)*cos(theta) = ", np.round(math.sqrt(0.5)*np.cos(theta), 5))
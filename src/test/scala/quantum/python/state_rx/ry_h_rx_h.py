@@ -1,13 +1,10 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 import math
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 # e^(-i*theta)*cos(theta)|0> + e^(i*theta)*sin(theta)|1>
@@ -38,6 +35,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
     print("probability of 0 = cos^2(theta)", np.round(math.pow(np.cos(theta), 2), 5))
     print("probability of 1 = sin^2(theta)", np.round(math.pow(np.sin(theta), 2), 5))
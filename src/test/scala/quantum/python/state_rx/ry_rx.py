@@ -1,13 +1,10 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import numpy as np
 import math
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 # (cos^2(theta) + i*sin^2(theta))|0> + (sin(theta)*cos(theta) + i*sin(theta)*cos(theta))|1>
@@ -36,6 +33,7 @@ if __name__ == "__main__":
 
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
     print("probability of 0 = cos^2(theta)", np.round(math.pow(np.cos(theta), 2), 5))
     print("probability of 1 = 2*sin^2(theta)*cos^2(theta) = sin^2(2*theta)/2", np.round(math.pow(np.sin(2*theta), 2)/2, 5))
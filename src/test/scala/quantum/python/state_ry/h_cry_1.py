@@ -1,13 +1,10 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-from qiskit.tools import visualization
-
 import math
 import numpy as np
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 
@@ -49,6 +46,7 @@ if __name__ == "__main__":
     hist = util.get_probs((qc, None, None), 'sim')
     print("Probabilities:", hist)
 
+    from qiskit.tools import visualization
     visualization.plot_histogram(hist)
 
     print("1/sqrt(2)*cos(phi) = ", math.sqrt(0.5)*np.round(np.cos(phi), 5))
@@ -1,11 +1,9 @@
-# importing QISKit
-from qiskit import QuantumCircuit, QuantumRegister
-
 import numpy as np
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from circuit import QuantumCircuit, QuantumRegister
 import util
 
 # I = Z Ry(-pi/2) H
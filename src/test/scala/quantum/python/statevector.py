@@ -0,0 +1,505 @@
+import warnings
+from collections import namedtuple
+from functools import lru_cache, partial
+
+import numpy as np
+
+import amplification
+import ancilla
+import blocks
+import circuit
+import diagonal
+import fusion
+import parallel
+import prefix_cache
+import profiler
+import results
+import trajectories
+
+# backend names util.run dispatches to this engine
+BACKENDS = ['local_numpy_simulator']
+
+# amplitude types the state can be stored in
+PRECISIONS = {
+    'double': np.complex128,
+    'single': np.complex64
+}
+
+# the same for circuits whose amplitudes stay real, see is_real
+REAL_PRECISIONS = {
+    'double': np.float64,
+    'single': np.float32
+}
+
+# gate matrices of numeric parameters kept for reuse across ops and compiles
+MATRIX_CACHE = 4096
+
+# narrower circuits skip gate fusion and the prefix cache: a pass over 2^n amplitudes
+# costs less than fusing gates or hashing the gate sequence
+FUSE_QUBITS = 10
+CACHE_QUBITS = 10
+
+# largest |<psi|psi> - 1| tolerated before a lower precision result is flagged; results
+# are rounded to 5 decimals
+DRIFT_TOLERANCE = 1e-5
+
+_SQ2 = 1 / np.sqrt(2)
+
+_FIXED = {
+    'id': np.eye(2),
+    'iden': np.eye(2),
+    'x': np.array([[0, 1], [1, 0]]),
+    'y': np.array([[0, -1j], [1j, 0]]),
+    'z': np.array([[1, 0], [0, -1]]),
+    'h': np.array([[_SQ2, _SQ2], [_SQ2, -_SQ2]]),
+    's': np.diag([1, 1j]),
+    'sdg': np.diag([1, -1j]),
+    't': np.diag([1, np.exp(1j*np.pi/4)]),
+    'tdg': np.diag([1, np.exp(-1j*np.pi/4)]),
+    'swap': np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
+}
+
+# controlled versions of single qubit gates: name -> (number of controls, base gate)
+_CONTROLLED = {
+    'cx': (1, 'x'),
+    'CX': (1, 'x'),
+    'cy': (1, 'y'),
+    'cz': (1, 'z'),
+    'ch': (1, 'h'),
+    'crz': (1, 'rz'),
+    'cu1': (1, 'u1'),
+    'cu3': (1, 'u3'),
+    'ccx': (2, 'x')
+}
+
+
+def _mat(rows):
+    # stacks scalar or array entries into (..., d, d), so parameter arrays give a batch of matrices
+    entries = np.broadcast_arrays(*[np.asarray(e) for row in rows for e in row])
+    d = len(rows)
+    return np.stack(entries, axis=-1).reshape(entries[0].shape + (d, d))
+
+
+def u3(theta, phi, lam):
+    return _mat([
+        [np.cos(theta/2), -np.exp(1j*lam)*np.sin(theta/2)],
+        [np.exp(1j*phi)*np.sin(theta/2), np.exp(1j*(phi + lam))*np.cos(theta/2)]
+    ])
+
+
+def _parametric(name, p):
+    if name == 'rx':
+        return _mat([[np.cos(p[0]/2), -1j*np.sin(p[0]/2)], [-1j*np.sin(p[0]/2), np.cos(p[0]/2)]])
+    if name == 'ry':
+        return _mat([[np.cos(p[0]/2), -np.sin(p[0]/2)], [np.sin(p[0]/2), np.cos(p[0]/2)]])
+    if name in ('u1', 'rz'):
+        # QISKit's rz is u1, only the controlled crz is the symmetric diag(e^-i/2, e^i/2)
+        return _mat([[1, 0], [0, np.exp(1j*p[0])]])
+    if name == 'u2':
+        return u3(np.pi/2, p[0], p[1])
+    if name == 'u3':
+        return u3(p[0], p[1], p[2])
+    raise ValueError("unsupported gate: " + name)
+
+
+def controlled(matrix, n_ctrl):
+    d = matrix.shape[-1]
+    m = np.zeros(matrix.shape[:-2] + (d << n_ctrl, d << n_ctrl), dtype=np.result_type(matrix, float))
+    m[..., np.arange(d << n_ctrl), np.arange(d << n_ctrl)] = 1
+    m[..., -d:, -d:] = matrix
+    return m
+
+
+def _param(x):
+    return x if isinstance(x, np.ndarray) else float(x)
+
+
+def matrix(name, params=()):
+    # matrices are shared between calls and must not be written to
+    if name in _FIXED:
+        return _FIXED[name]
+    if name == 'unitary':
+        # gates multiplied together by fusion.fuse
+        return params[0]
+    try:
+        return _numeric_matrix(name, tuple(params))
+    except TypeError:
+        # parameter arrays are not hashable, symbolic parameters fail in _param
+        return _matrix(name, params)
+
+
+@lru_cache(maxsize=MATRIX_CACHE)
+def _numeric_matrix(name, params):
+    # fusion, diagonal accumulation and is_real all ask for the same gates' matrices
+    m = _matrix(name, params)
+    m.setflags(write=False)
+    return m
+
+
+def _matrix(name, params):
+    p = [_param(x) for x in params]
+    if name in _CONTROLLED:
+        n_ctrl, base = _CONTROLLED[name]
+        if base == 'rz':
+            m = _mat([[np.exp(-0.5j*p[0]), 0], [0, np.exp(0.5j*p[0])]])
+        elif base == 'u3':
+            # qelib1's cu3 controls e^(-i(phi+lambda)/2) u3, not u3 itself
+            m = u3(*p) * np.exp(-0.5j*(p[1] + p[2]))[..., None, None]
+        else:
+            m = matrix(base, p)
+        return controlled(m, n_ctrl)
+
+    return _parametric(name, p)
+
+
+def _cast(a, state):
+    # matrices and phases in the state's type; a real state only ever meets real ones
+    a = np.asarray(a)
+    if not np.iscomplexobj(state):
+        a = a.real
+    return a.astype(state.dtype, copy=False)
+
+
+def zero_state(n, dtype=complex):
+    state = np.zeros((2,) * n, dtype=dtype)
+    state[(0,) * n] = 1
+    return state
+
+
+def _axes(state, qubits):
+    # qubit k of a little endian index is axis n-1-k of the C-ordered tensor
+    return [state.ndim - 1 - q for q in qubits]
+
+
+def apply(state, m, qubits):
+    # the first listed qubit is the most significant bit of the gate matrix
+    k = len(qubits)
+    axes = _axes(state, qubits)
+    u = _cast(m, state).reshape((2,) * 2 * k)
+    out = np.tensordot(u, state, axes=(list(range(k, 2*k)), axes))
+    return np.moveaxis(out, list(range(k)), axes)
+
+
+def _controlled_index(state, qubits):
+    index = [slice(None)] * state.ndim
+    for a in _axes(state, qubits):
+        index[a] = 1
+    return index
+
+
+def mcx(state, qubits):
+    # swaps target 0/1 only inside the slice where every control is 1
+    index = _controlled_index(state, qubits[:-1])
+    t = _axes(state, qubits[-1:])[0]
+    index[t] = 0
+    i0 = tuple(index)
+    index[t] = 1
+    i1 = tuple(index)
+    zero = state[i0].copy()
+    state[i0] = state[i1]
+    state[i1] = zero
+    return state
+
+
+def mcz(state, qubits):
+    # the phase flip is symmetric, controls and target all have to be 1
+    state[tuple(_controlled_index(state, qubits))] *= -1
+    return state
+
+
+# gates applied by indexing or as a whole block instead of a matrix;
+# for mcx / mcz the qubits are the controls followed by the target
+IN_PLACE = set(['mcx', 'mcz'])
+
+NATIVE = {
+    'mcx': mcx,
+    'mcz': mcz,
+    'qft': blocks.qft,
+    'iqft': blocks.iqft
+}
+
+
+def multiply(state, phases, qubits):
+    # phases is indexed little endian over qubits, which have to be ascending
+    shape = [1] * state.ndim
+    for q in qubits:
+        shape[state.ndim - 1 - q] = 2
+    state *= _cast(phases, state).reshape(shape)
+    return state
+
+
+def probability_one(state, qubit):
+    axis = _axes(state, [qubit])[0]
+    return np.sum(np.abs(np.take(state, 1, axis=axis))**2)
+
+
+def collapse(state, qubit, bit):
+    axis = _axes(state, [qubit])[0]
+    index = [slice(None)] * state.ndim
+    index[axis] = 1 - bit
+    state = state.copy()
+    state[tuple(index)] = 0
+    return state / np.linalg.norm(state)
+
+
+def initialize(state, amplitudes, qubits):
+    # the initialized qubits have to be |0> and therefore not entangled with the rest
+    axes = _axes(state, qubits)
+    index = [slice(None)] * state.ndim
+    for a in axes:
+        index[a] = 0
+    rest = state[tuple(index)]
+    if not np.isclose(np.linalg.norm(rest), 1):
+        raise ValueError("initialize is only supported on qubits in state |0>")
+
+    k = len(qubits)
+    amplitudes = np.asarray([complex(a) for a in amplitudes]).reshape((2,) * k)
+    # amplitudes are indexed little endian over the listed qubits
+    out = _cast(np.multiply.outer(amplitudes, rest), state)
+    return np.moveaxis(out, list(range(k)), _axes(state, list(reversed(qubits))))
+
+
+def step(state, op, rng=None, clbits=None, threads=1):
+    if profiler.ACTIVE is not None:
+        return profiler.ACTIVE.gate(_step, state, op, rng, clbits, threads)
+    return _step(state, op, rng, clbits, threads)
+
+
+def _step(state, op, rng, clbits, threads):
+    if op.name == 'barrier':
+        return state
+    elif op.name == 'measure':
+        p1 = probability_one(state, op.qubits[0])
+        bit = int(rng.random() < p1)
+        clbits[op.clbits[0]] = bit
+        return collapse(state, op.qubits[0], bit)
+    elif op.name == 'reset':
+        p1 = probability_one(state, op.qubits[0])
+        if rng.random() < p1:
+            return apply(collapse(state, op.qubits[0], 1), _FIXED['x'], op.qubits)
+        return collapse(state, op.qubits[0], 0)
+    elif op.name == 'initialize':
+        return initialize(state, op.params, op.qubits)
+    elif op.name == 'diagonal':
+        return parallel.run(lambda s, q: multiply(s, op.params[0], q), state, op.qubits, threads, True)
+    elif op.name in NATIVE:
+        out = parallel.run(NATIVE[op.name], state, op.qubits, threads, op.name in IN_PLACE)
+        # FFT blocks compute in double precision
+        return out.astype(state.dtype, copy=False)
+    m = matrix(op.name, op.params)
+    return parallel.run(lambda s, q: apply(s, m, q), state, op.qubits, threads)
+
+
+def is_real(ops):
+    # True if every gate has a real matrix, so real amplitudes stay real
+    for op in ops:
+        if op.name in ('barrier', 'measure', 'reset', 'mcx', 'mcz'):
+            continue
+        if op.name in blocks.KERNELS:
+            return False
+        if op.name == 'initialize':
+            values = [complex(p) for p in op.params]
+        elif op.name == 'diagonal':
+            values = op.params[0]
+        else:
+            values = matrix(op.name, op.params)
+        if np.any(np.imag(values)):
+            return False
+    return True
+
+
+def simulate(ops, n, rng=None, clbits=None, state=None, threads=1, dtype=complex):
+    if state is None:
+        state = zero_state(n, dtype)
+    for op in ops:
+        state = step(state, op, rng, clbits, threads)
+    return state
+
+
+# states of recently simulated gate sequences, shared by all runs in this process
+PREFIX_CACHE = prefix_cache.PrefixCache()
+
+
+def _simulate_unitary(ops, n, cache, threads, dtype):
+    if cache is None or n < CACHE_QUBITS:
+        return simulate(ops, n, threads=threads, dtype=dtype)
+    return prefix_cache.simulate(ops, n, cache, lambda state, op: step(state, op, threads=threads), dtype)
+
+
+def terminal_measurements(ops):
+    # the measures if nothing but other measures and barriers follow them on their qubits
+    measures = []
+    measured = set()
+    for op in ops:
+        if op.name == 'measure':
+            if op.qubits[0] in measured:
+                return None
+            measured.add(op.qubits[0])
+            measures.append(op)
+        elif op.name == 'reset' or (op.name != 'barrier' and measured.intersection(op.qubits)):
+            return None
+    return measures
+
+
+def sample(state, measures, shots, rng):
+    p = np.abs(state.reshape(-1))**2
+    support = np.flatnonzero(p)
+    return draw(support, p[support], measures, shots, rng)
+
+
+def draw(support, p, measures, shots, rng):
+    # one multinomial draw over basis states, then folded onto the classical bits
+    p = np.asarray(p, dtype=float)
+    drawn = rng.multinomial(shots, p / p.sum())
+    hit = drawn > 0
+    support, drawn = support[hit], drawn[hit]
+
+    outcomes = np.zeros(len(support), dtype=np.int64)
+    for op in measures:
+        outcomes &= ~(1 << op.clbits[0])
+        outcomes |= ((support >> op.qubits[0]) & 1) << op.clbits[0]
+    return outcomes, drawn
+
+
+class Result(object):
+    # state covers the given qubits of an n_qubits register, all other qubits are |0>
+    def __init__(self, state, counts=None, qubits=None, n_qubits=None, fused=0):
+        self.state = state
+        self.counts = counts
+        self.qubits = qubits
+        self.n_qubits = state.ndim if n_qubits is None else n_qubits
+        # passes over the state saved by gate fusion and diagonal accumulation
+        self.fused = fused
+
+    def get_statevector(self, qc=None):
+        # complex like any other backend's, also when simulated with real amplitudes
+        state = self.state.reshape(-1).astype(np.result_type(self.state, np.complex64), copy=False)
+        if self.qubits is None or len(self.qubits) == self.n_qubits:
+            return state
+        full = np.zeros(2**self.n_qubits, dtype=state.dtype)
+        full[results.deposit(np.arange(len(state)), self.qubits)] = state
+        return full
+
+    @profiler.timed('histogram')
+    def probabilities(self, decimals=5):
+        hist = results.probabilities(np.round(self.state, decimals), decimals,
+                                     qubits=self.qubits, n_qubits=self.n_qubits)
+        # single precision values would print as their nearest double
+        hist.array = np.round(hist.array.astype(float), decimals)
+        return hist
+
+    @profiler.timed('histogram')
+    def amplitudes(self, decimals=5):
+        hist = results.amplitudes(np.round(self.state, decimals), qubits=self.qubits, n_qubits=self.n_qubits)
+        hist.array = np.round(hist.array.astype(complex), decimals)
+        return hist
+
+    def drift(self):
+        # how far rounding in the state's precision has moved it off the unit sphere
+        return abs(np.sum(np.abs(self.state.astype(np.complex128))**2) - 1)
+
+    def support(self, tol=results.TOL):
+        state = self.state.reshape(-1)
+        support = np.flatnonzero(np.abs(state) > tol)
+        return results.support(support, state[support], self.state.ndim, tol, self.qubits, self.n_qubits)
+
+    def support_size(self, tol=results.TOL):
+        return int(np.count_nonzero(np.abs(self.state) > tol))
+
+    def get_counts(self, qc=None):
+        return self.counts
+
+    def get_data(self, qc=None):
+        data = {}
+        if self.state is not None:
+            data['statevector'] = self.get_statevector(qc)
+        if self.counts is not None:
+            data['counts'] = self.counts
+        return data
+
+
+def _checked(result):
+    if result.state.real.dtype != np.float64 and result.drift() > DRIFT_TOLERANCE:
+        warnings.warn("state norm drifted by %g in %s, use precision='double'" % (result.drift(), result.state.dtype))
+    return result
+
+
+# a circuit lowered for the engines: gates over the n kept qubits of an n_qubits register,
+# the terminal measures (None if some measurement is followed by other gates), or the
+# closed form of a Grover search when amplification matched it
+Program = namedtuple('Program', ['ops', 'n', 'qubits', 'n_qubits', 'n_clbits', 'sizes', 'measures', 'fused',
+                                 'grover'])
+
+
+@profiler.timed('transpile')
+def compile(qc, reduce_ancillas=True, amplify=True, fuse=True):
+    # the lowering every local engine runs, each one simulates the resulting ops
+    n_qubits = circuit.num_qubits(qc)
+    # tagged QFT blocks run as one FFT each
+    ops = blocks.collapse(circuit.ops(qc), circuit.tags(qc))
+    qubits = None
+    if reduce_ancillas:
+        # clean ancillas are never allocated, their uses become mcx / mcz gates
+        ops, qubits = ancilla.reduce(ops, n_qubits)
+    n = n_qubits if qubits is None else len(qubits)
+
+    n_clbits = circuit.num_clbits(qc)
+    sizes = circuit.creg_sizes(qc)
+
+    unitary = not any(op.name in ('measure', 'reset') for op in ops)
+    grover = amplification.match(ops, n) if unitary and amplify and not n_clbits else None
+    if grover is not None:
+        # oracle + diffusion iterations only rotate within a 2d subspace
+        grover.qubits, grover.n_qubits = qubits, n_qubits
+        return Program(ops, n, qubits, n_qubits, n_clbits, sizes, [], 0, grover)
+
+    fused = 0
+    if fuse and n >= FUSE_QUBITS and len(ops) > 1:
+        # runs of gates on the same one or two qubits become one matrix each
+        ops, fused = fusion.fuse(ops, matrix)
+        # then runs of diagonal gates become one phase vector each
+        ops, accumulated = diagonal.accumulate(ops, matrix)
+        fused += accumulated
+    return Program(ops, n, qubits, n_qubits, n_clbits, sizes, terminal_measurements(ops), fused, None)
+
+
+def unitary_part(program, engine):
+    # the gates before the terminal measures, for engines that cannot measure mid-circuit
+    ops = [op for op in program.ops if op.name not in ('measure', 'barrier')]
+    if program.measures is None or any(op.name in ('reset', 'initialize') for op in ops):
+        raise ValueError("the %s engine only supports unitary gates followed by measurements" % engine)
+    return ops
+
+
+def sampled_counts(program, state, shots, seed, sample=sample):
+    # counts of the terminal measures drawn from the final state; with nothing measured
+    # every shot reads the classical bits as zero
+    if not program.measures:
+        return results.counts(np.zeros(1), program.n_clbits, program.sizes, [shots]) if program.n_clbits else None
+    outcomes, drawn = sample(state, program.measures, shots, np.random.default_rng(seed))
+    return results.counts(outcomes, program.n_clbits, program.sizes, drawn)
+
+
+@profiler.timed('simulate')
+def execute(program, shots=1, seed=None, workers=None, cache=PREFIX_CACHE, threads=None, precision='double',
+            real=True):
+    if program.grover is not None:
+        return program.grover
+    ops, n, qubits, n_qubits, n_clbits, sizes, measures, fused, _ = program
+
+    # ry / h / x / cx / z style circuits run on a real state, half the memory and work
+    dtype = (REAL_PRECISIONS if real and is_real(ops) else PRECISIONS)[precision]
+
+    if measures is None:
+        # every shot is its own trajectory, there is no single final state to report
+        outcomes, drawn = trajectories.run(partial(simulate, dtype=dtype), ops, n, n_clbits, shots, seed, workers)
+        return Result(None, results.counts(outcomes, n_clbits, sizes, drawn), qubits, n_qubits, fused)
+
+    # measuring at the end does not change the state, simulate once and sample all shots
+    state = _simulate_unitary([op for op in ops if op.name != 'measure'], n, cache, threads, dtype)
+    return _checked(Result(state, sampled_counts(program, state, shots, seed), qubits, n_qubits, fused))
+
+
+def run(qc, shots=1, seed=None, reduce_ancillas=True, amplify=True, workers=None, cache=PREFIX_CACHE, fuse=True,
+        threads=None, precision='double', real=True):
+    return execute(compile(qc, reduce_ancillas, amplify, fuse), shots, seed, workers, cache, threads, precision, real)
@@ -0,0 +1,85 @@
+import numpy as np
+import sympy
+
+import blocks
+import circuit
+import statevector
+
+# Parameter sweeps: build the circuit once with sympy symbols in place of the angles,
+# then evaluate every gate for all parameter points at once on a (batch, 2^n) state.
+#
+#   theta, phi = sweep.parameters('theta phi')
+#   qc, _, _ = single_qbit_state.build_circuit(theta, phi)
+#   probs = sweep.probs(qc, {theta: np.linspace(0, np.pi, 10000), phi: 0.321})
+#
+# Columns are basis states in QISKit's little endian order, rows follow the batch.
+
+
+def parameters(names):
+    return sympy.symbols(names)
+
+
+def _bindings(values):
+    bindings = {}
+    for k, v in values.items():
+        symbol = sympy.Symbol(k) if isinstance(k, str) else k
+        bindings[symbol] = np.asarray(v, dtype=float)
+    batch = np.broadcast(*bindings.values()).shape if bindings else ()
+    if len(batch) > 1:
+        raise ValueError("parameter values have to be scalars or 1-d arrays")
+    return bindings, (batch[0] if batch else 1)
+
+
+def _evaluate(p, bindings, batch):
+    free = getattr(p, 'free_symbols', None)
+    if not free:
+        return float(p)
+
+    missing = free - set(bindings.keys())
+    if missing:
+        raise ValueError("no values for parameters: " + ", ".join(sorted(str(s) for s in missing)))
+
+    symbols = sorted(free, key=str)
+    f = sympy.lambdify(symbols, p, 'numpy')
+    return np.broadcast_to(np.asarray(f(*[bindings[s] for s in symbols]), dtype=float), (batch,))
+
+
+def apply(states, m, qubits):
+    # states: (batch, 2, ..., 2), m: (2^k, 2^k) shared or (batch, 2^k, 2^k) per point
+    n = states.ndim - 1
+    k = len(qubits)
+    axes = [n - q for q in qubits]
+    moved = np.moveaxis(states, axes, list(range(n + 1 - k, n + 1)))
+    shape = moved.shape
+    flat = moved.reshape(shape[0], -1, 2**k)
+    out = np.matmul(flat, np.swapaxes(m, -1, -2))
+    return np.moveaxis(out.reshape(shape), list(range(n + 1 - k, n + 1)), axes)
+
+
+def simulate(qc, values):
+    bindings, batch = _bindings(values)
+    n = circuit.num_qubits(qc)
+
+    states = np.zeros((batch,) + (2,) * n, dtype=complex)
+    states[(slice(None),) + (0,) * n] = 1
+
+    for op in blocks.collapse(circuit.ops(qc), circuit.tags(qc)):
+        if op.name == 'barrier':
+            continue
+        if op.name in ('measure', 'reset', 'initialize'):
+            raise ValueError("sweeps only support unitary gates, got: " + op.name)
+
+        if op.name in statevector.NATIVE:
+            # the batch axis leads, qubit axes are counted from the end as in a single state
+            states = statevector.NATIVE[op.name](states, op.qubits)
+            continue
+
+        params = [_evaluate(p, bindings, batch) for p in op.params]
+        states = apply(states, statevector.matrix(op.name, params), op.qubits)
+
+    return states.reshape(batch, -1)
+
+
+def probs(qc, values):
+    states = simulate(qc, values)
+    return np.real(states * np.conj(states))
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Shot by shot simulation for circuits whose measurements cannot be sampled from one
+# final state. Shots are split into one chunk per RNG stream, every stream is seeded
+# from the same SeedSequence, and each worker sends back only its aggregated counts,
+# so the merged result depends on seed and streams but not on how many workers run them.
+
+# below this many shots a process pool costs more than it saves
+PARALLEL_SHOTS = 256
+
+# RNG streams shots are split into, fixed so that a seed gives the same counts on any
+# machine and with any number of workers
+STREAMS = 64
+
+
+def _chunk(args):
+    simulate, ops, n, n_clbits, shots, seed = args
+    rng = np.random.default_rng(seed)
+    outcomes = np.zeros(shots, dtype=np.int64)
+    for shot in range(shots):
+        bits = [0] * n_clbits
+        simulate(ops, n, rng, bits)
+        outcomes[shot] = sum(b << k for k, b in enumerate(bits))
+    return np.unique(outcomes, return_counts=True)
+
+
+def run(simulate, ops, n, n_clbits, shots, seed=None, workers=None, streams=STREAMS):
+    # simulate(ops, n, rng, clbits) runs one trajectory and fills in the classical bits;
+    # returns (outcomes, counts) with clbit k as bit k of an outcome. Workers only decide
+    # which process runs which stream.
+    if workers is None:
+        workers = os.cpu_count() if shots >= PARALLEL_SHOTS else 1
+
+    seeds = np.random.SeedSequence(seed).spawn(streams)
+    sizes = [shots // streams + (1 if i < shots % streams else 0) for i in range(streams)]
+    tasks = [(simulate, ops, n, n_clbits, size, s) for size, s in zip(sizes, seeds) if size]
+
+    if workers == 1:
+        chunks = [_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            chunks = list(pool.map(_chunk, tasks))
+
+    outcomes = np.concatenate([c[0] for c in chunks])
+    counts = np.concatenate([c[1] for c in chunks])
+    return outcomes, counts
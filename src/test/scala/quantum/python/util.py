@@ -1,15 +1,40 @@
+from contextlib import contextmanager
+
 import numpy as np
 
-# importing QISKit
-from qiskit import compile, execute, register, available_backends, get_backend
+import circuit
 import Qconfig
-
-def controlled_X(qc, ctrl, anc, tgt):
+import profiler
+import qobj_cache
+import results
+from session import session_for
+
+# local backend -> engine module (whose BACKENDS lists it); an engine and the pass modules
+# it needs are only imported once its backend is selected
+LOCAL_ENGINES = {
+    'local_numpy_simulator': 'statevector',
+    'local_sparse_simulator': 'sparse',
+    'local_memmap_simulator': 'outofcore',
+    'local_shared_simulator': 'distributed'
+}
+
+def controlled_X(qc, ctrl, anc, tgt, native = False):
+    if native:
+        return mcx(qc, ctrl, tgt[0])
     return controlled(qc, ctrl, anc, tgt)
 
-def controlled_Z(qc, ctrl, anc, tgt):
+def controlled_Z(qc, ctrl, anc, tgt, native = False):
+    if native:
+        return mcz(qc, ctrl, tgt[0])
     return controlled(qc, ctrl, anc, tgt, c_gate = lambda qc, ctrl, tgt: qc.cz(ctrl, tgt))
 
+# native multi-controlled gates without ancillas, only understood by the numpy engine
+def mcx(qc, ctrl, tgt):
+    return qc._attach(circuit.Instruction('mcx', [], [ctrl[i] for i in range(len(ctrl))] + [tgt]))
+
+def mcz(qc, ctrl, tgt):
+    return qc._attach(circuit.Instruction('mcz', [], [ctrl[i] for i in range(len(ctrl))] + [tgt]))
+
 def controlled(qc, ctrl, anc, tgt, c_gate = lambda qc, c, t: qc.cx(c, t), cc_gate = lambda qc, c1, c2, t: qc.ccx(c1, c2, t)):
     n = len(ctrl)
 
@@ -26,6 +51,15 @@ def controlled(qc, ctrl, anc, tgt, c_gate = lambda qc, c, t: qc.cx(c, t), cc_gat
         cc_gate(qc, ctrl[i], anc[i-2], anc[i-1])
     cc_gate(qc, ctrl[0], ctrl[1], anc[0])
 
+# tags the gates added inside the block so the numpy engine can run them as one operation
+@contextmanager
+def block(qc, name, q):
+    start = len(qc.data)
+    yield
+    if not hasattr(qc, 'blocks'):
+        qc.blocks = []
+    qc.blocks.append((name, [q[i] for i in range(len(q))], start, len(qc.data)))
+
 def cx0(qc, c, t):
     qc.x(c)
     qc.cx(c, t)
@@ -39,53 +73,80 @@ def ccx0(qc, c1, c2, t):
     qc.x(c1)
     qc.x(c2)
 
-def run(shots, qc, cfg, backend = None):
-    if 'url' in cfg.keys():
-        register(cfg['token'], cfg['url'], cfg['hub'], cfg['group'], cfg['project'])
-        print(available_backends())
-
-    if backend is None:
-        backend = cfg['backend']
-
-    backend_config = get_backend(backend).configuration
-    backend_coupling = backend_config['coupling_map']
-
-    qc_compiled = compile([qc], backend=backend, coupling_map=backend_coupling, seed=0)
-    qc_compiled_qasm = qc_compiled['circuits'][0]['compiled_circuit_qasm']
-    #print(qc_compiled_qasm)
-
-    job = execute([qc], backend=backend, shots=shots)
+# session: a session.Session for cfg, reused across calls to skip registering and fetching
+# the backend configuration again; a session for another cfg entry raises ValueError
+def run(shots, qc, cfg, backend = None, seed = None, workers = None, precision = 'double', session = None):
+    session = session_for(cfg, session)
+    backend = session.backend_name(backend)
+
+    engine = LOCAL_ENGINES.get(backend)
+    if engine == 'statevector':
+        import statevector
+        return statevector.run(qc, shots, seed, workers=workers, precision=precision)
+    if precision != 'double':
+        # every other backend keeps its amplitudes in complex128
+        raise ValueError("precision %r is only supported on local_numpy_simulator" % precision)
+    if engine == 'sparse':
+        import sparse
+        return sparse.run(qc, shots, seed, workers=workers)
+    if engine == 'outofcore':
+        import outofcore
+        return outofcore.run(qc, shots, seed)
+    if engine == 'distributed':
+        import distributed
+        return distributed.run(qc, shots, seed, workers=workers)
+
+    backend_coupling = session.coupling_map(backend)
+
+    # compiled once per circuit / backend / coupling map, reused across calls and processes
+    qobj = qobj_cache.compile(circuit.to_qiskit(qc), backend, backend_coupling, seed=0, shots=shots,
+                              basis_gates=session.basis_gates(backend))
+    #print(qobj['circuits'][0]['compiled_circuit_qasm'])
+
+    job = session.backend(backend).run(qobj)
     result = job.result()
 
     return result
 
 
-def get_counts(c, cfg, backend = None):
+# seed and workers only apply to the numpy engine: shots are sampled from one final state,
+# or spread over a process pool when measurements happen mid-circuit;
+# precision 'single' keeps its state in complex64 (other backends raise ValueError)
+def get_counts(c, cfg, backend = None, shots = 1024, seed = None, workers = None, precision = 'double',
+               session = None):
     qc, qr, cr = c
     qc.measure(qr, cr)
-    result = run(1024, qc, Qconfig.cfg[cfg], backend)
+    result = run(shots, qc, Qconfig.cfg[cfg], backend, seed, workers, precision, session)
     counts = result.get_counts()
     # visualization.plot_circuit(qc)
+    if not isinstance(counts, results.Histogram):
+        counts = results.from_counts(counts)
     return counts
 
 
+@profiler.timed('histogram')
 def histogram(state):
-    n = len(state)
-    pow = int(np.log2(n))
-    keys = [bin(i)[2::].rjust(pow, '0')[::-1] for i in range(0, n)]
-    #keys = [bin(i)[2::].rjust(pow, '0') for i in range(0, n)]
+    # keys are bit strings with qubit 0 first, formatted only when asked for
+    print("Quantum state:", results.amplitudes(state))
 
-    print("Quantum state:", dict(zip(keys, state)))
+    return results.probabilities(state, 5)
 
-    probs = [np.round(abs(a)*abs(a), 5) for a in state]
-    hist = dict(zip(keys, probs))
-    filtered_hist = dict(filter(lambda p: p[1] > 0, hist.items()))
-    return filtered_hist
 
-
-def get_probs(c, cfg):
+def get_probs(c, cfg, backend = 'local_statevector_simulator', precision = 'double', session = None):
     qc, _, _ = c
     # visualization.plot_circuit(qc)
-    result = run(1, qc, Qconfig.cfg[cfg], 'local_statevector_simulator')
-    state = np.round(result.get_data(qc)['statevector'], 5)
-    return histogram(state)
\ No newline at end of file
+    result = run(1, qc, Qconfig.cfg[cfg], backend, precision=precision, session=session)
+    if hasattr(result, 'probabilities'):
+        # stays in the engine's reduced space, no full statevector is built
+        print("Quantum state:", result.amplitudes(5))
+        return result.probabilities(5)
+
+    state = np.round(result.get_data(qc.name)['statevector'], 5)
+    return histogram(state)
+
+
+def get_sweep_probs(c, values):
+    # one row of basis state probabilities per parameter point, see sweep.py
+    import sweep
+    qc, _, _ = c
+    return sweep.probs(qc, values)